@@ -0,0 +1,111 @@
+"""
+Benchmark of Modflow head readers - memory-mapped binary heads (.hds) against formatted heads (.fhd)
+on a synthetic grid, for the access patterns of the simulation: heads of the top layer at the last saved time
+(water level transfer to Hydrus) and heads of each stress period (output export).
+
+Usage (from the repository root): python -m benchmarks.head_reader_benchmark [--rows 1000 --cols 1000]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from processing.modflow import modflow_head_reader
+from processing.timing_utils import StageTimer
+
+# Formatted heads keep 6 significant digits (1PE13.5)
+FORMATTED_RELATIVE_TOLERANCE = 1e-5
+
+__FORMATTED_VALUES_PER_LINE = 10
+__BINARY_HEADER_DTYPE = np.dtype([("kstp", "<i4"), ("kper", "<i4"), ("pertim", "<f4"), ("totim", "<f4"),
+                                  ("text", "S16"), ("ncol", "<i4"), ("nrow", "<i4"), ("ilay", "<i4")])
+
+
+def create_heads(rows: int, cols: int, layers: int, stress_periods: int, seed: int = 0) -> np.ndarray:
+    """
+    @return: (stress periods, layers, rows, cols) array of heads
+    """
+    rng = np.random.default_rng(seed)
+    return (100.0 + rng.normal(0, 5, (stress_periods, layers, rows, cols))).astype(np.float32)
+
+
+def write_binary_heads(path: str, heads: np.ndarray) -> None:
+    with open(path, 'wb') as fp:
+        for period_idx, period_heads in enumerate(heads):
+            for layer_idx, layer_heads in enumerate(period_heads):
+                header = np.array([(1, period_idx + 1, 1.0, period_idx + 1.0, b"            HEAD",
+                                    layer_heads.shape[1], layer_heads.shape[0], layer_idx + 1)],
+                                  dtype=__BINARY_HEADER_DTYPE)
+                fp.write(header.tobytes())
+                fp.write(np.ascontiguousarray(layer_heads, dtype="<f4").tobytes())
+
+
+def write_formatted_heads(path: str, heads: np.ndarray) -> None:
+    with open(path, 'wb') as fp:
+        for period_idx, period_heads in enumerate(heads):
+            for layer_idx, layer_heads in enumerate(period_heads):
+                rows, cols = layer_heads.shape
+                fp.write(f"{1:5d}{period_idx + 1:5d}{1.0:15.6E}{period_idx + 1.0:15.6E}{'HEAD':>17}"
+                         f"{cols:6d}{rows:6d}{layer_idx + 1:6d} (10(1X1PE13.5))\n".encode("ascii"))
+                # each model row starts on a new line
+                for row in layer_heads.tolist():
+                    for line_start in range(0, cols, __FORMATTED_VALUES_PER_LINE):
+                        line_values = row[line_start:line_start + __FORMATTED_VALUES_PER_LINE]
+                        fp.write(("".join(f" {value:13.5E}" for value in line_values) + "\n").encode("ascii"))
+
+
+def read_last_top_layer(head_file_path: str) -> np.ndarray:
+    with modflow_head_reader.open_head_file(head_file_path) as head_data:
+        return head_data.get_data(layer=0)
+
+
+def read_all_periods(head_file_path: str, stress_periods: int) -> np.ndarray:
+    with modflow_head_reader.open_head_file(head_file_path) as head_data:
+        return np.stack([head_data.get_data(idx=stress_period) for stress_period in range(stress_periods)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--cols", type=int, default=1000)
+    parser.add_argument("--layers", type=int, default=1)
+    parser.add_argument("--stress-periods", type=int, default=3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    heads = create_heads(args.rows, args.cols, args.layers, args.stress_periods)
+    work_dir = tempfile.mkdtemp(prefix="head_reader_benchmark_")
+    try:
+        binary_path = os.path.join(work_dir, "benchmark.hds")
+        formatted_path = os.path.join(work_dir, "benchmark.fhd")
+        write_binary_heads(binary_path, heads)
+        write_formatted_heads(formatted_path, heads)
+
+        results = {}
+        timer = StageTimer(f"Reading heads of a {args.rows}x{args.cols}x{args.layers} grid "
+                           f"({args.stress_periods} stress periods)")
+        for path_name, head_file_path in (("formatted", formatted_path), ("binary", binary_path)):
+            with timer.stage(f"{path_name} - last time, top layer"):
+                last_top_layer = read_last_top_layer(head_file_path)
+            with timer.stage(f"{path_name} - all stress periods"):
+                all_periods = read_all_periods(head_file_path, args.stress_periods)
+            results[path_name] = (last_top_layer, all_periods)
+        timer.log()
+        for access_name in ("last time, top layer", "all stress periods"):
+            speedup = timer.stage_times[f"formatted - {access_name}"] / timer.stage_times[f"binary - {access_name}"]
+            logging.info(f"Speedup ({access_name}): {speedup:.1f}x")
+
+        np.testing.assert_array_equal(results["binary"][0], heads[-1, 0])
+        np.testing.assert_array_equal(results["binary"][1], heads)
+        for formatted, binary in zip(results["formatted"], results["binary"]):
+            np.testing.assert_allclose(formatted, binary, rtol=FORMATTED_RELATIVE_TOLERANCE)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
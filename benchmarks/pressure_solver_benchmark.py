@@ -0,0 +1,144 @@
+"""
+Benchmark of the bottom-up pressure profile update - the previous solver (per node root finding with K(h)
+constants recomputed in each evaluation and pandas indexing) against the current one.
+
+Usage (from the repository root): python -m benchmarks.pressure_solver_benchmark [--nodes 1000 --profiles 20]
+"""
+
+import argparse
+import logging
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import root_scalar
+
+from processing.hydrus import hydraulic_conductivity
+from processing.hydrus.hydrus_profile_pressure_calculator import ProfileFlowState, solve_pressure_profile
+from processing.timing_utils import StageTimer
+
+# thr, ths, Alfa, n, Ks, l
+MATERIALS = np.array([[0.045, 0.43, 0.145, 2.68, 712.8, 0.5],
+                      [0.078, 0.43, 0.036, 1.56, 24.96, 0.5]])
+
+
+def create_flow_states(profile_count: int, node_count: int, seed: int = 0) -> Dict[int, ProfileFlowState]:
+    rng = np.random.default_rng(seed)
+    node_depths = -np.linspace(0, 300, node_count)
+    node_material_ids = np.where(np.arange(node_count) < node_count // 2, 1, 2)
+    materials = hydraulic_conductivity.get_materials(0, MATERIALS)
+
+    flow_states = {}
+    for profile_idx in range(profile_count):
+        # downward and upward fluxes of different magnitudes, close to steady flow in the whole profile
+        bottom_flux = float(rng.choice([-0.5, -0.01, 0.003, 0.2]) * rng.uniform(0.5, 2))
+        node_pressure = -150 - node_depths + rng.normal(0, 3, node_count)
+        node_conductivity = np.array([materials[material_id - 1].conductivity(h)
+                                      for h, material_id in zip(node_pressure, node_material_ids)])
+        flow_states[profile_idx] = ProfileFlowState(node_depths=node_depths,
+                                                    node_material_ids=node_material_ids,
+                                                    node_pressure=node_pressure,
+                                                    node_conductivity=node_conductivity,
+                                                    node_flux=bottom_flux * (1 + rng.normal(0, 0.01, node_count)),
+                                                    bottom_flux=bottom_flux,
+                                                    bottom_pressure=float(rng.uniform(-40, 50)),
+                                                    i_model=0,
+                                                    material_properties=MATERIALS)
+    return flow_states
+
+
+def solve_pressure_profile_previous(flow_state: ProfileFlowState) -> np.ndarray:
+    # previous solver (without printing the roots) - profile and materials indexed through pandas
+    x = pd.Series(flow_state.node_depths)
+    matid = pd.Series(flow_state.node_material_ids)
+    material_properties = pd.DataFrame(flow_state.material_properties)
+    i_model = flow_state.i_model
+    qbot = flow_state.bottom_flux
+    qold = flow_state.node_flux
+    h2new = flow_state.node_pressure.copy()
+    h2new[-1] = flow_state.bottom_pressure
+    h_low = h2new[-1]
+    k_low = flow_state.node_conductivity[-1]
+
+    for idx in range(len(h2new) - 2, 0, -1):
+        qold1 = 0.5 * (qold[idx] + qold[idx + 1])
+        if qold1 * qbot < 0:
+            break
+        qmax = max(abs(qold1), abs(qbot))
+        if abs(qold1 - qbot) > (1e-12 + 0.1 * qmax):
+            break
+
+        dz = abs(x.iloc[idx + 1] - x.iloc[idx])
+        material = [material_properties.iloc[matid.iloc[idx] - 1, col_idx] for col_idx in range(6)]
+        targs = (qbot, h_low, k_low, dz, i_model, *material)
+
+        hmin = -1000.
+        kmin = __kh_previous(hmin, i_model, *material)
+        fluxmax = -0.5 * (kmin + k_low) * ((hmin - h_low) / dz + 1)
+        hmax = 100.
+        fluxmin = -0.5 * (material[4] + k_low) * ((hmax - h_low) / dz + 1)
+        hz = h_low - dz
+        if abs(qbot) < 1e-12:
+            h_up = hz
+        elif qbot < 0:
+            h_up = hmax if qbot < fluxmin else root_scalar(__flux_bal_previous, args=targs, bracket=[hz, hmax]).root
+        else:
+            h_up = hmin if qbot > fluxmax else root_scalar(__flux_bal_previous, args=targs, bracket=[hmin, hz]).root
+        h2new[idx] = h_up
+        h_low = h_up
+        k_low = __kh_previous(h_low, i_model, *material)
+    return h2new
+
+
+def __kh_previous(h, i_model, qr, qs, alfa, n, ks, b_par):
+    # previous K(h) of iModel 0 - constants independent of the pressure head computed in each evaluation
+    ks = max(ks, 1.0e-37)
+    qm, qa, qk, kk = qs, qr, qs, ks
+    m = 1.0 - 1.0 / n
+    h_min = -1.0e300 ** (1.0 / n) / max(alfa, 1.0)
+    qees = min((qs - qa) / (qm - qa), 0.999999999999999)
+    qeek = min((qk - qa) / (qm - qa), qees)
+    hs = -1.0 / alfa * (qees ** (-1.0 / m) - 1.0) ** (1.0 / n)
+    hk = -1.0 / alfa * (qeek ** (-1.0 / m) - 1.0) ** (1.0 / n)
+    if h < hk:
+        qee = (1.0 + (-alfa * max(h, h_min)) ** n) ** (-m)
+        qe = (qm - qa) / (qs - qa) * qee
+        ffq = 1.0 - (1.0 - qee ** (1.0 / m)) ** (-m)
+        if ffq <= 0.0:
+            ffq = m * qee ** (1.0 / m)
+        kr = qe ** b_par * ffq ** 2
+        return max(ks * kr, 1.0e-37)
+    if h < hs:
+        return ks * ((1.0 - kk / ks) / (hs - hk) * (h - hs) + 1)
+    return ks
+
+
+def __flux_bal_previous(h, q, h0, k0, dz, *material_args):
+    return q + 0.5 * (k0 + __kh_previous(h, *material_args)) * ((h - h0) / dz + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--profiles", type=int, default=20)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    flow_states = create_flow_states(args.profiles, args.nodes)
+    materials = hydraulic_conductivity.get_materials(0, MATERIALS)
+    timer = StageTimer(f"Pressure update of {args.profiles} profiles with {args.nodes} nodes")
+    with timer.stage("previous"):
+        previous = {profile_idx: solve_pressure_profile_previous(flow_state)
+                    for profile_idx, flow_state in flow_states.items()}
+    with timer.stage("current"):
+        current = {profile_idx: solve_pressure_profile(flow_state, materials)
+                   for profile_idx, flow_state in flow_states.items()}
+    timer.log()
+    logging.info(f"Speedup: {timer.stage_times['previous'] / timer.stage_times['current']:.1f}x")
+
+    for profile_idx in flow_states:
+        np.testing.assert_array_equal(current[profile_idx], previous[profile_idx])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of the recharge transfer to Modflow - RCH package loaded and written once for all recharge zones
+against the previous path (RCH package loaded, updated and written again for each zone).
+
+Usage (from the repository root): python -m benchmarks.recharge_writer_benchmark [--rows 200 --zones 20]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+
+import flopy
+import numpy as np
+
+from processing import data_passing_utils
+from processing.modflow import modflow_model_cache, modflow_utils
+from processing.timing_utils import StageTimer
+
+# batched update used by recharge_from_hydrus_to_modflow
+__recharge_update = getattr(data_passing_utils, "__recharge_update")
+
+
+def create_model(model_dir: str, rows: int, cols: int, stress_periods: int) -> None:
+    model = flopy.modflow.Modflow("benchmark", model_ws=model_dir)
+    flopy.modflow.ModflowDis(model, nlay=1, nrow=rows, ncol=cols, nper=stress_periods,
+                             perlen=[1.0] + [30.0] * (stress_periods - 1),
+                             steady=[True] + [False] * (stress_periods - 1))
+    flopy.modflow.ModflowBas(model)
+    flopy.modflow.ModflowRch(model, rech=1.0e-4)
+    model.write_input()
+
+
+def create_zones(rows: int, cols: int, zone_count: int, seed: int = 0) -> np.ndarray:
+    """
+    @return: (rows, cols) raster - 0 for cells outside zones, i + 1 for cells of i-th zone
+    """
+    rng = np.random.default_rng(seed)
+    zone_labels = np.zeros((rows, cols), dtype=np.int32)
+    # vertical stripes, each one covering a random part of the rows
+    for zone_idx, stripe in enumerate(np.array_split(np.arange(cols), zone_count)):
+        first_row, last_row = np.sort(rng.integers(0, rows, 2))
+        zone_labels[first_row:last_row + 1, stripe] = zone_idx + 1
+    return zone_labels
+
+
+def write_recharge_per_zone(model_dir: str, zone_labels: np.ndarray, zone_recharge: np.ndarray) -> None:
+    # previous path - load RCH, update cells of a single zone, write RCH
+    for zone_idx in range(len(zone_recharge)):
+        model = flopy.modflow.Modflow.load(modflow_utils.scan_for_modflow_file(model_dir, ext=".nam"),
+                                           model_ws=model_dir, load_only=["rch"], forgive=True)
+        mask = zone_labels == zone_idx + 1
+        transient_idx = 0
+        for idx in range(model.nper):
+            if not model.modeltime.steady_state[idx]:
+                recharge_array = model.rch.rech[idx].array
+                recharge_array[mask] = zone_recharge[zone_idx, transient_idx]
+                model.rch.rech[idx] = recharge_array
+                transient_idx += 1
+        __write_rch(model)
+
+
+def write_recharge_batched(model_dir: str, zone_labels: np.ndarray, zone_recharge: np.ndarray) -> None:
+    model = modflow_model_cache.load_model(model_dir, load_only=["rch"], for_update=True)
+    __recharge_update(model, zone_labels, zone_recharge)
+    __write_rch(model)
+
+
+def __write_rch(model: flopy.modflow.Modflow) -> None:
+    rch_package = model.get_package("rch")
+    flopy.modflow.ModflowRch(model, nrchop=rch_package.nrchop, ipakcb=rch_package.ipakcb, rech=model.rch.rech,
+                             irch=rch_package.irch).write_file(check=False)
+
+
+def read_recharge(model_dir: str) -> np.ndarray:
+    model = flopy.modflow.Modflow.load(modflow_utils.scan_for_modflow_file(model_dir, ext=".nam"),
+                                       model_ws=model_dir, load_only=["rch"], forgive=True, check=False)
+    return model.rch.rech.array
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--cols", type=int, default=200)
+    parser.add_argument("--stress-periods", type=int, default=13)
+    parser.add_argument("--zones", type=int, default=20)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    zone_labels = create_zones(args.rows, args.cols, args.zones)
+    zone_recharge = np.random.default_rng(1).uniform(0, 1.0e-3, (args.zones, args.stress_periods - 1))
+
+    work_dir = tempfile.mkdtemp(prefix="recharge_benchmark_")
+    try:
+        ref_dir = os.path.join(work_dir, "ref")
+        create_model(ref_dir, args.rows, args.cols, args.stress_periods)
+        per_zone_dir = shutil.copytree(ref_dir, os.path.join(work_dir, "per_zone"))
+        batched_dir = shutil.copytree(ref_dir, os.path.join(work_dir, "batched"))
+
+        timer = StageTimer(f"RCH update of {args.zones} zones on a {args.rows}x{args.cols} grid "
+                           f"({args.stress_periods} stress periods)")
+        with timer.stage("per zone"):
+            write_recharge_per_zone(per_zone_dir, zone_labels, zone_recharge)
+        with timer.stage("batched"):
+            write_recharge_batched(batched_dir, zone_labels, zone_recharge)
+        timer.log()
+        logging.info(f"Speedup: {timer.stage_times['per zone'] / timer.stage_times['batched']:.1f}x")
+
+        if not np.array_equal(read_recharge(per_zone_dir), read_recharge(batched_dir)):
+            raise AssertionError("Batched RCH package differs from the one written per zone!")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of ATMOSPH.IN and METEO.IN truncation - data table sliced and renumbered in bulk against the previous
+line by line path, on synthetic multi-decade daily files.
+
+Usage (from the repository root): python -m benchmarks.table_truncation_benchmark [--years 40 --repeats 5]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+from typing import Tuple, Type
+
+import numpy as np
+
+from processing.hydrus.file_processing.atmosph_in_processor import AtmosphInProcessor
+from processing.hydrus.file_processing.line_by_line_processor import LineByLineProcessor
+from processing.hydrus.file_processing.meteo_in_processor import MeteoInProcessor
+from processing.timing_utils import StageTimer
+
+DAYS_PER_YEAR = 365
+
+
+class AtmosphInLineByLineProcessor(AtmosphInProcessor):
+
+    def _save_sliced_data(self, *args) -> Tuple[float, float]:
+        return self._save_sliced_data_by_lines(*args)
+
+
+class MeteoInLineByLineProcessor(MeteoInProcessor):
+
+    def _save_sliced_data(self, *args) -> Tuple[float, float]:
+        return self._save_sliced_data_by_lines(*args)
+
+
+def write_atmosph_in(path: str, record_count: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', encoding='utf-8') as fp:
+        fp.write("Pcp_File_Version=4\n"
+                 "*** BLOCK I: ATMOSPHERIC INFORMATION  **********************************\n"
+                 "   MaxAL                    (MaxAL = number of atmospheric data-records)\n"
+                 f"{record_count:7d}\n"
+                 " DailyVar  SinusVar  lLay  lBCCycles lInterc lDummy  lDummy  lDummy  lDummy  lDummy\n"
+                 "       f       f       f       f       f       f       f       f       f       f\n"
+                 " hCritS                 (max. allowed pressure head at the soil surface)\n"
+                 "      0\n"
+                 "       tAtm        Prec       rSoil       rRoot      hCritA          rB          hB          ht\n")
+        for day, prec, r_soil, r_root in zip(range(1, record_count + 1),
+                                             np.round(rng.exponential(0.2, record_count), 4),
+                                             np.round(rng.uniform(0, 0.3, record_count), 4),
+                                             np.round(rng.uniform(0, 0.3, record_count), 4)):
+            fp.write(f"{day:11d}{prec:12g}{r_soil:12g}{r_root:12g}      100000           0           0           0\n")
+        fp.write("end*** END OF INPUT FILE 'ATMOSPH.IN' **********************************\n")
+
+
+def write_meteo_in(path: str, record_count: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', encoding='utf-8') as fp:
+        fp.write("Pcp_File_Version=4\n"
+                 "* METEOROLOGICAL PARAMETERS AND INFORMATION\n"
+                 "MeteoRecords Radiation Penman-Hargreaves\n"
+                 f"{record_count:7d}      2      t\n"
+                 "   [T]      Rad      TMax      TMin    RHMean      Wind  SunHours\n")
+        for day, t_max, rh_mean in zip(range(1, record_count + 1),
+                                       np.round(rng.uniform(0, 30, record_count), 2),
+                                       np.round(rng.uniform(40, 100, record_count), 1)):
+            fp.write(f"{day:7d}{12.5:9g}{t_max:10g}{t_max - 8:10g}{rh_mean:10g}{200:10d}{6:10d}\n")
+        fp.write("end*** END OF INPUT FILE 'METEO.IN' **********************************\n")
+
+
+def truncate(processor_class: Type[LineByLineProcessor], path: str, data_start_idx: int,
+             data_count: int) -> Tuple[float, float]:
+    with open(path, 'r+', encoding='utf-8') as fp:
+        return processor_class(fp).truncate_file(data_start_idx, data_count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=40)
+    parser.add_argument("--truncated-days", type=int, default=DAYS_PER_YEAR)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    record_count = args.years * DAYS_PER_YEAR
+    data_start_indices = np.random.default_rng(1).integers(0, record_count - args.truncated_days, args.repeats)
+    work_dir = tempfile.mkdtemp(prefix="table_truncation_benchmark_")
+    try:
+        for file_name, write_file, processor_class, line_by_line_processor_class in (
+                ("ATMOSPH.IN", write_atmosph_in, AtmosphInProcessor, AtmosphInLineByLineProcessor),
+                ("METEO.IN", write_meteo_in, MeteoInProcessor, MeteoInLineByLineProcessor)):
+            source_path = os.path.join(work_dir, file_name)
+            write_file(source_path, record_count)
+
+            timer = StageTimer(f"Truncating {args.truncated_days} days of a {args.years}-year daily {file_name} "
+                               f"({args.repeats} times)")
+            for data_start_idx in data_start_indices.tolist():
+                results = {}
+                for path_name, truncating_class in (("line by line", line_by_line_processor_class),
+                                                    ("bulk", processor_class)):
+                    path = shutil.copyfile(source_path, os.path.join(work_dir, f"{path_name}_{file_name}"))
+                    with timer.stage(path_name):
+                        time_steps = truncate(truncating_class, path, data_start_idx, args.truncated_days)
+                    with open(path, 'r', encoding='utf-8') as fp:
+                        results[path_name] = (time_steps, fp.read())
+                if results["bulk"] != results["line by line"]:
+                    raise AssertionError(f"Bulk truncation of {file_name} differs from the line by line one "
+                                         f"(records from {data_start_idx})!")
+            timer.log()
+            logging.info(f"Speedup: {timer.stage_times['line by line'] / timer.stage_times['bulk']:.1f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import json
+import logging
 from argparse import ArgumentParser
 from json import JSONDecodeError
 from typing import Dict
 
+from processing.local_fs_configuration import directory_index
+from processing.modflow import modflow_model_cache
 from processing.modflow.modflow_metadata import ModflowMetadata
 # very important imports - used in CLI, accessed through globals() dict
 from processing.task_logic.data_tasks_logic import \
@@ -11,7 +14,7 @@ from processing.task_logic.data_tasks_logic import \
 from processing.unit_manager import LengthUnit
 from processing.task_logic.configuration_tasks_logic import local_files_initialization, extract_output_to_json, \
     initialize_feedback_iteration, create_hydrus_models_for_zones, pre_configure_iteration, cleanup_project_volume, \
-    preserve_reference_hydrus_models
+    preserve_reference_hydrus_models, extract_feedback_loop_output
 
 
 def __create_parser() -> ArgumentParser:
@@ -22,6 +25,7 @@ def __create_parser() -> ArgumentParser:
                             choices=[
                                 "local_files_initialization",
                                 "extract_output_to_json",
+                                "extract_feedback_loop_output",
                                 "initialize_feedback_iteration",
                                 "preserve_reference_hydrus_models",
                                 "create_hydrus_models_for_zones",
@@ -42,6 +46,11 @@ def __create_parser() -> ArgumentParser:
     arg_parser.add_argument("--is_feedback_loop", action="store_true")
     arg_parser.add_argument("--no_feedback_loop", action="store_false", dest="is_feedback_loop")
     arg_parser.add_argument("--spin_up", type=int)
+    arg_parser.add_argument("--output_format", choices=["json", "npy", "npz"], default="json")
+    arg_parser.add_argument("--output_precision", type=int)  # decimals to round output values to
+    arg_parser.add_argument("--workers", type=int, default=1)  # size of worker pool for per-model tasks
+    # stage timings and cache statistics are logged at INFO
+    arg_parser.add_argument("--log_level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO")
     return arg_parser
 
 
@@ -71,7 +80,10 @@ if __name__ == "__main__":
     parser = __create_parser()
     cli_kwargs = parser.parse_args().__dict__
     function_names = cli_kwargs.pop("action")
+    logging.basicConfig(level=cli_kwargs.pop("log_level"), format="%(asctime)s %(levelname)s %(message)s")
     parsed_kwargs = __parse_cli_kwargs(cli_kwargs)
     for func_name in function_names:
         function_to_call = globals()[func_name]
         function_to_call(**parsed_kwargs)
+    logging.info(f"Modflow model cache statistics: {modflow_model_cache.get_stats()}")
+    logging.info(f"Directory index statistics: {directory_index.get_stats()}")
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Dict, Union, List
+from typing import Dict, Union, List, Tuple
 
 import flopy
 import numpy as np
@@ -7,14 +7,16 @@ import pandas as pd
 import phydrus as ph
 from flopy.modflow import Modflow
 
-from . import unit_manager
+from . import unit_manager, worker_pool
 from .hydrus import hydrus_utils, hydrus_model_management
-from .hydrus.file_processing.selector_in_processor import SelectorInProcessor
+from .hydrus.hydrus_model import HydrusModel
 from .local_fs_configuration import local_paths
 from .local_fs_configuration.feedback_loop_file_management import find_previous_simulation_step_dir
 from .local_fs_configuration.path_constants import get_feedback_loop_hydrus_name
-from .modflow import modflow_utils, modflow_model_management
+from .modflow import modflow_model_management, modflow_model_cache
 from .modflow.modflow_metadata import ModflowMetadata
+from .shape_index import get_shape_index
+from .timing_utils import StageTimer
 from .unit_manager import LengthUnit
 from .weather_data import weather_util
 
@@ -32,31 +34,27 @@ def recharge_from_hydrus_to_modflow(project_id: str,
     @param model_to_shapes_mapping: Hydrus model/float value -> list of shape_id assigned to that shape
     """
 
+    if not model_to_shapes_mapping:
+        return
+
     prev_step_dir = find_previous_simulation_step_dir(project_id)
     if prev_step_dir is not None:
         spin_up = 0
 
-    for mapping_val, assigned_shape_ids in model_to_shapes_mapping.items():
-        __process_hydrus_shapes(assigned_shape_ids, mapping_val, modflow_metadata,
-                                project_id, spin_up, feedback_loop)
-
-
-def __process_hydrus_shapes(assigned_shape_ids, mapping_val, modflow_metadata: ModflowMetadata,
-                            project_id: str, spin_up: int,
-                            feedback_loop: bool = False):
     modflow_path = local_paths.get_modflow_model_path(project_id, modflow_metadata.modflow_id, simulation_mode=True)
-    nam_file = modflow_utils.scan_for_modflow_file(modflow_path)
 
-    # load MODFLOW model - basic info and RCH package
-    modflow_model = flopy.modflow.Modflow.load(nam_file, model_ws=modflow_path,
-                                               load_only=["rch"],
-                                               forgive=True)
+    # load MODFLOW model - basic info and RCH package (once for all zones), RCH package is replaced below
+    modflow_model = modflow_model_cache.load_model(modflow_path, load_only=["rch"], for_update=True)
 
-    shapes_for_model = [np.load(local_paths.get_shape_path(project_id, shape_id))
-                        for shape_id in assigned_shape_ids]
-
-    sum_v_bot = __get_sum_vbot(project_id, mapping_val, modflow_metadata.grid_unit, spin_up)
-    __recharge_update(modflow_model, shapes_for_model, sum_v_bot)
+    # integer zone-label raster (0 - cell not assigned) and average recharge per zone and transient stress period
+    zone_labels = np.zeros((modflow_model.nrow, modflow_model.ncol), dtype=np.int32)
+    zone_recharge = []
+    for zone_label, (mapping_val, assigned_shape_ids) in enumerate(model_to_shapes_mapping.items(), start=1):
+        zone_mask, zone_avg_recharge = __process_hydrus_shapes(modflow_model, assigned_shape_ids, mapping_val,
+                                                               modflow_metadata, project_id, spin_up, feedback_loop)
+        zone_labels[zone_mask] = zone_label
+        zone_recharge.append(zone_avg_recharge)
+    __recharge_update(modflow_model, zone_labels, np.array(zone_recharge))
 
     new_recharge = modflow_model.rch.rech
     rch_package = modflow_model.get_package("rch")  # get the RCH package
@@ -64,6 +62,21 @@ def __process_hydrus_shapes(assigned_shape_ids, mapping_val, modflow_metadata: M
     flopy.modflow.ModflowRch(modflow_model, nrchop=rch_package.nrchop, ipakcb=rch_package.ipakcb,
                              rech=new_recharge,
                              irch=rch_package.irch).write_file(check=False)
+    modflow_model_cache.invalidate(modflow_path)
+
+
+def __process_hydrus_shapes(modflow_model: Modflow, assigned_shape_ids, mapping_val,
+                            modflow_metadata: ModflowMetadata,
+                            project_id: str, spin_up: int,
+                            feedback_loop: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    @return: Boolean mask of the zone and its average recharge for each transient stress period
+    """
+
+    mask = get_shape_index(project_id).get_combined_mask(assigned_shape_ids)
+
+    sum_v_bot = __get_sum_vbot(project_id, mapping_val, modflow_metadata.grid_unit, spin_up)
+    return mask, __get_avg_recharge_per_stress_period(modflow_model, sum_v_bot)
 
 
 def __get_sum_vbot(project_id: str,
@@ -74,9 +87,7 @@ def __get_sum_vbot(project_id: str,
                                                          hydrus_id=mapping_val,
                                                          simulation_mode=True)
 
-    selector_path = hydrus_utils.find_hydrus_file_path(hydrus_model_dir, file_name="selector.in")
-    with open(selector_path, 'r', encoding='utf-8') as fp:
-        hydrus_len_unit = SelectorInProcessor(fp).get_model_length()
+    hydrus_len_unit = HydrusModel(hydrus_model_dir).get_length_unit()
 
     if isinstance(mapping_val, str):
         hydrus_recharge_path = hydrus_utils.find_hydrus_file_path(hydrus_model_dir, file_name="t_level.out")
@@ -99,28 +110,40 @@ def __get_sum_vbot(project_id: str,
         raise DataProcessingException("Unknown mapping in simulation!")
 
 
-def __recharge_update(modflow_model: Modflow, shapes_for_model: List[np.ndarray], sum_v_bot: pd.Series):
-    shape = np.amax(shapes_for_model, axis=0) if len(shapes_for_model) > 1 else shapes_for_model[0]
-    mask = (shape == 1)  # Frontend sets explicitly 1
-    stress_period_duration_iter = 0
+def __get_avg_recharge_per_stress_period(modflow_model: Modflow,
+                                         sum_v_bot: Union[pd.Series, float]) -> np.ndarray:
+    transient = ~np.asarray(modflow_model.modeltime.steady_state, dtype=bool)
+    stress_period_durations = np.asarray(modflow_model.modeltime.perlen, dtype=np.float64)[transient]
+
+    if isinstance(sum_v_bot, float):
+        # constant recharge assigned to the zone
+        return np.full(len(stress_period_durations), sum_v_bot)
 
-    for idx, stress_period_duration in enumerate(modflow_model.modeltime.perlen):
-        if not modflow_model.modeltime.steady_state[idx]:
-            # modflow rch array for given stress period
-            recharge_modflow_array = modflow_model.rch.rech[idx].array
+    # Hydrus days covered by each transient stress period (steady state periods do not advance the time)
+    period_durations = stress_period_durations.astype(int)
+    period_starts = np.cumsum(period_durations) - period_durations
+    period_ends = period_starts + period_durations - 1
 
-            # add calculated hydrus average sum(vBot) to modflow recharge array
-            period_duration = int(stress_period_duration)
-            final_sp_recharge = sum_v_bot.values[stress_period_duration_iter + period_duration - 1]
-            starting_sp_recharge = sum_v_bot.values[stress_period_duration_iter]
-            avg_sum_v_bot = (final_sp_recharge - starting_sp_recharge) / stress_period_duration
-            recharge_modflow_array[mask] = avg_sum_v_bot
+    sum_v_bot_values = np.asarray(sum_v_bot.values)
+    return (sum_v_bot_values[period_ends] - sum_v_bot_values[period_starts]) / stress_period_durations
 
-            # save calculated recharge to modflow model
-            modflow_model.rch.rech[idx] = recharge_modflow_array
 
-            # update stress period duration iterator
-            stress_period_duration_iter += period_duration
+def __recharge_update(modflow_model: Modflow, zone_labels: np.ndarray, zone_recharge: np.ndarray):
+    """
+    @param zone_labels: (rows, cols) raster - 0 for cells outside zones, i + 1 for cells of i-th zone
+    @param zone_recharge: (zones, transient stress periods) average recharge of each zone
+    """
+
+    transient_periods = np.flatnonzero(~np.asarray(modflow_model.modeltime.steady_state, dtype=bool))
+    zone_cells = zone_labels > 0
+
+    # (transient stress periods, rows, cols) cube of modflow rch arrays
+    recharge_cube = modflow_model.rch.rech.array[transient_periods, 0]
+    recharge_cube[:, zone_cells] = zone_recharge[zone_labels[zone_cells] - 1].T
+
+    # save calculated recharge to modflow model
+    for cube_idx, stress_period in enumerate(transient_periods):
+        modflow_model.rch.rech[int(stress_period)] = recharge_cube[cube_idx]
 
 
 def transfer_water_level_to_hydrus(project_id: str,
@@ -133,35 +156,109 @@ def transfer_water_level_to_hydrus(project_id: str,
                                                                              modflow_id=modflow_metadata.modflow_id,
                                                                              shape_id=shape_id,
                                                                              use_modflow_results=use_modflow_results)
-    hydrus_profile_depth, hydrus_depth_unit = hydrus_model_management.get_profile_depth(project_id,
-                                                                                        hydrus_id=compound_hydrus_id)
+    __update_hydrus_water_level(project_id, compound_hydrus_id, water_avg_depth, modflow_metadata.grid_unit)
+
+
+def transfer_water_levels_to_hydrus(project_id: str,
+                                    shapes_to_hydrus: Dict[str, str],
+                                    modflow_metadata: ModflowMetadata,
+                                    use_modflow_results: bool = True,
+                                    workers: int = 1) -> None:
+    """
+    Batched version of transfer_water_level_to_hydrus - Modflow model and heads are loaded once for all shapes,
+    then Hydrus models are updated in a pool of workers.
+
+    @param shapes_to_hydrus: shape_id -> plain hydrus_id
+    """
+
+    water_avg_depths = modflow_model_management.get_avg_water_depths_for_shapes(
+        project_id=project_id,
+        modflow_id=modflow_metadata.modflow_id,
+        shape_ids=list(shapes_to_hydrus.keys()),
+        use_modflow_results=use_modflow_results
+    )
+    worker_pool.run_tasks(__update_hydrus_water_level,
+                          tasks={shape_id: {"project_id": project_id,
+                                            "compound_hydrus_id": get_feedback_loop_hydrus_name(hydrus_id, shape_id),
+                                            "water_avg_depth": water_avg_depths[shape_id],
+                                            "modflow_unit": modflow_metadata.grid_unit}
+                                 for shape_id, hydrus_id in shapes_to_hydrus.items()},
+                          workers=workers)
+
+
+def __update_hydrus_water_level(project_id: str, compound_hydrus_id: str,
+                                water_avg_depth: float, modflow_unit: LengthUnit) -> None:
+    hydrus_model = hydrus_model_management.load_model(project_id, hydrus_id=compound_hydrus_id)
+    hydrus_profile_depth, hydrus_depth_unit = hydrus_model_management.get_profile_depth(hydrus_model)
     water_avg_depth = unit_manager.convert_units(water_avg_depth,
-                                                 from_unit=modflow_metadata.grid_unit,
+                                                 from_unit=modflow_unit,
                                                  to_unit=hydrus_depth_unit)
 
-    hydrus_model_management.update_bottom_pressure(project_id=project_id,
-                                                   hydrus_id=compound_hydrus_id,
+    hydrus_model_management.update_bottom_pressure(hydrus_model,
+                                                   project_id=project_id,
                                                    hydrus_profile_depth=hydrus_profile_depth,
                                                    water_avg_depth=water_avg_depth,
                                                    hydrus_unit=hydrus_depth_unit)
+    hydrus_model.flush()
 
 
 def pass_weather_data_to_hydrus(project_id: str, start_date: str, spin_up: int,
                                 modflow_metadata: ModflowMetadata,
-                                hydrus_to_weather_mapping: Dict[str, str]) -> None:
+                                hydrus_to_weather_mapping: Dict[str, str],
+                                workers: int = 1) -> None:
+    """
+    Each weather file is read once and adapted once per Hydrus length unit, then the data is applied
+    to the Hydrus models in a pool of workers.
+
+    @param hydrus_to_weather_mapping: hydrus_id -> weather_id
+    """
+
+    timer = StageTimer("Weather data transfer to Hydrus")
+    data_start_date = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=spin_up) if start_date else None
+    record_count = 1 + modflow_metadata.get_duration() + spin_up
+
+    with timer.stage("loading Hydrus models"):
+        hydrus_models = {hydrus_id: hydrus_model_management.load_model(project_id, hydrus_id)
+                         for hydrus_id in hydrus_to_weather_mapping}
+
+    raw_weather_data = {}
+    weather_data = {}
+    tasks = {}
     for hydrus_id, weather_id in hydrus_to_weather_mapping.items():
-        hydrus_path = local_paths.get_hydrus_model_path(project_id, hydrus_id, simulation_mode=True)
-        selector_in_path = hydrus_utils.find_hydrus_file_path(hydrus_path, file_name="selector.in")
-
-        with open(selector_in_path, 'r', encoding='utf-8') as fp:
-            hydrus_length_unit = SelectorInProcessor(fp).get_model_length()
-
-        data_start_date = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=spin_up) if start_date else None
-        raw_data = weather_util.read_weather_csv(local_paths.get_weather_model_path(project_id, weather_id),
-                                                 start_date=data_start_date,
-                                                 record_count=1 + modflow_metadata.get_duration() + spin_up)
-        ready_data = weather_util.adapt_data(raw_data, hydrus_length_unit)
-        success = weather_util.add_weather_to_hydrus_model(hydrus_path, ready_data)
-        if not success:
-            raise DataProcessingException(f"Error occurred during applying "
-                                          f"weather file {weather_id} to hydrus model {hydrus_id}")
+        hydrus_length_unit = hydrus_models[hydrus_id].get_length_unit()
+        weather_data_key = (weather_id, hydrus_length_unit, data_start_date, record_count)
+        if weather_data_key not in weather_data:
+            with timer.stage(f"weather {weather_id} ({hydrus_length_unit})"):
+                if weather_id not in raw_weather_data:
+                    raw_weather_data[weather_id] = weather_util.read_weather_csv(
+                        local_paths.get_weather_model_path(project_id, weather_id),
+                        start_date=data_start_date,
+                        record_count=record_count,
+                        cache_dir=local_paths.get_weather_cache_dir(project_id)
+                    )
+                ready_data = weather_util.adapt_data(raw_weather_data[weather_id], hydrus_length_unit)
+                weather_data[weather_data_key] = (ready_data, weather_util.format_weather_data(ready_data))
+
+        ready_data, formatted_data = weather_data[weather_data_key]
+        tasks[hydrus_id] = {"hydrus_model": hydrus_models[hydrus_id],
+                            "weather_id": weather_id,
+                            "ready_data": ready_data,
+                            "formatted_data": formatted_data}
+
+    # Weather data is shared by the models - threads avoid copying it to worker processes
+    with timer.stage("applying to Hydrus models"):
+        worker_pool.run_tasks(__apply_weather_data, tasks=tasks, workers=workers, use_threads=True)
+    timer.log()
+
+
+def __apply_weather_data(hydrus_model: HydrusModel, weather_id: str,
+                         ready_data: Dict[str, np.ndarray], formatted_data: Dict[str, List[str]]) -> None:
+    timer = StageTimer(f"Weather {weather_id} transfer to Hydrus model {hydrus_model.model_dir}")
+    with timer.stage("applying"):
+        success = weather_util.add_weather_to_hydrus_model(hydrus_model, ready_data, formatted_data)
+    if not success:
+        raise DataProcessingException(f"Error occurred during applying "
+                                      f"weather file {weather_id} to hydrus model {hydrus_model.model_dir}")
+    with timer.stage("writing"):
+        hydrus_model.flush()
+    timer.log()
@@ -2,6 +2,8 @@ from abc import abstractmethod
 from dataclasses import dataclass
 from typing import List, Tuple, Callable, Optional
 
+import numpy as np
+
 from .text_file_processor import TextFileProcessor
 from ... import julian_calendar_manager
 
@@ -27,18 +29,82 @@ class LineByLineProcessor(TextFileProcessor):
         total_data_records = 0
         data_start = -1
 
-        for i, line in enumerate(lines):
-            stripped = line.strip()
+        i = 0
+        while i < len(lines):
+            stripped = lines[i].strip()
             if stripped.startswith(total_record_count_line_prefix):
                 total_data_records = int(lines[i + 1].strip().split()[0].strip())
             elif stripped.startswith(data_content_line_prefix):
                 data_start = i + 1
+                # Data records (numbers only) contain no headers - skip them
+                i = data_start + total_data_records
+                continue
+            i += 1
 
         self._reset()
         return lines, data_start, total_data_records
 
     def _save_sliced_data(self, lines: List[str], data_start: int, total_data_records: int,
                           record_start_idx: int, record_count: int) -> Tuple[float, float]:
+        """
+        Leaves only the selected records in the data section, days of the records are renumbered
+        to consecutive julian days starting from the julian day of the first selected record.
+        """
+
+        new_data_start = data_start + record_start_idx
+        new_data_end = new_data_start + record_count
+        data_end = data_start + total_data_records
+
+        sliced_data = None
+        if 0 <= data_start <= new_data_start <= new_data_end <= data_end:
+            sliced_data = LineByLineProcessor.__slice_data_table(lines[new_data_start:new_data_end])
+        if sliced_data is None:
+            return self._save_sliced_data_by_lines(lines, data_start, total_data_records,
+                                                   record_start_idx, record_count)
+
+        new_data, first_data_time_step, last_data_time_step = sliced_data
+        self.fp.truncate()
+        self.fp.writelines(lines[:data_start])
+        self.fp.write(new_data)
+        self.fp.writelines(lines[data_end:])
+        self._reset()
+        return first_data_time_step, last_data_time_step
+
+    @staticmethod
+    def __slice_data_table(data_lines: List[str]) -> Optional[Tuple[str, Optional[float], Optional[float]]]:
+        """
+        Parses selected data records as a table of tokens in bulk, renumbers the day column and formats
+        the records back (same format as _substitute_in_line - tab separated columns).
+
+        @return: New content of the data section, first and last day - None if records do not form a regular table
+        """
+
+        if not data_lines:
+            return "", None, None
+
+        col_count = len(data_lines[0].split())
+        cells = np.array("".join(data_lines).split(), dtype=object)
+        if col_count == 0 or cells.size != col_count * len(data_lines):
+            return None
+        cells = cells.reshape(len(data_lines), col_count)
+
+        first_julian_day = julian_calendar_manager.float_to_julian(float(cells[0, 0]))
+        if not first_julian_day >= 0:
+            return None
+        # Days formatted as "%.3f" - julian day has at most 2 decimal places, so it is exact in thousandths
+        day_thousandths = round(first_julian_day * 1000) + 1000 * np.arange(len(data_lines), dtype=np.int64)
+        days = np.char.add(np.char.add((day_thousandths // 1000).astype(str), "."),
+                           np.char.zfill((day_thousandths % 1000).astype(str), 3))
+        cells[:, 0] = days
+
+        # Cells interleaved with separators - tabs between columns, new line after the last one
+        table = np.full((len(data_lines), 2 * col_count), "\t", dtype=object)
+        table[:, 0::2] = cells
+        table[:, -1] = "\n"
+        return "".join(table.ravel().tolist()), float(days[0]), float(days[-1])
+
+    def _save_sliced_data_by_lines(self, lines: List[str], data_start: int, total_data_records: int,
+                                   record_start_idx: int, record_count: int) -> Tuple[float, float]:
 
         new_data_start = data_start + record_start_idx
         new_data_end = new_data_start + record_count
@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class VanGenuchtenMaterial:
+    """
+    Hydraulic conductivity function K(h) of a material (van Genuchten-Mualem, Hydrus iModel 0, 1 and 3) with
+    the constants independent of pressure head computed once. Evaluates the exact expression.
+    """
+
+    i_model: int
+    alfa: float
+    n: float
+    m: float
+    ks: float
+    kk: float
+    b_par: float
+    h_min: float
+    hs: float
+    hk: float
+    qe_scale: float
+    qek: float
+    ffqk: float
+
+    # Credit to Adam Szymkiewicz
+    @staticmethod
+    def from_parameters(i_model: int, material_row: Sequence[float]) -> "VanGenuchtenMaterial":
+        """
+        @param material_row: Material parameters in SELECTOR.IN order (thr, ths, Alfa, n, Ks, l[, thm, tha, thk, Kk])
+        """
+
+        if i_model not in (0, 1, 3):
+            raise RuntimeError(f"Not implemented: iModel {i_model}!")
+
+        # Plain Python floats - the scalar K(h) is evaluated in tight loops
+        material_row = [float(value) for value in material_row]
+        qr, qs, alfa, n = material_row[0], material_row[1], material_row[2], material_row[3]
+        ks = max(material_row[4], 1.0e-37)
+        b_par = material_row[5]
+
+        qm, qa, qk, kk = qs, qr, qs, ks
+        if i_model == 1:
+            qm, qa, qk, kk = material_row[6], material_row[7], material_row[8], material_row[9]
+        elif i_model == 3:
+            qm = material_row[6]
+        m = 1.0 - 1.0 / n
+
+        qees = min((qs - qa) / (qm - qa), 0.999999999999999)
+        qeek = min((qk - qa) / (qm - qa), qees)
+        return VanGenuchtenMaterial(
+            i_model=int(i_model), alfa=alfa, n=n, m=m, ks=ks, kk=kk, b_par=b_par,
+            h_min=-1.0e300 ** (1.0 / n) / max(alfa, 1.0),
+            hs=-1.0 / alfa * (qees ** (-1.0 / m) - 1.0) ** (1.0 / n),
+            hk=-1.0 / alfa * (qeek ** (-1.0 / m) - 1.0) ** (1.0 / n),
+            qe_scale=(qm - qa) / (qs - qa),
+            qek=(qm - qa) / (qs - qa) * qeek,
+            ffqk=1.0 - (1.0 - qeek ** (1.0 / m)) ** (-m)
+        )
+
+    # Credit to Adam Szymkiewicz
+    def conductivity(self, h: float) -> float:
+        # calculates hydraulic conductivity as a function of pressure head
+        # required to modify Hydrus pressure profiles after each Modflow period
+        ks = self.ks
+        if h < self.hk:
+            qee = (1.0 + (-self.alfa * max(h, self.h_min)) ** self.n) ** (-self.m)
+            qe = self.qe_scale * qee
+            ffq = 1.0 - (1.0 - qee ** (1.0 / self.m)) ** (-self.m)
+            if ffq <= 0.0:
+                ffq = self.m * qee ** (1.0 / self.m)
+            if self.i_model == 0:
+                kr = qe ** self.b_par * ffq ** 2
+            else:
+                kr = (qe / self.qek) ** self.b_par * (ffq / self.ffqk) ** 2 * self.kk / ks
+            return max(ks * kr, 1.0e-37)
+        if h < self.hs:
+            kr = (1.0 - self.kk / ks) / (self.hs - self.hk) * (h - self.hs) + 1
+            return ks * kr
+        return ks
+
+
+def get_materials(i_model: int, material_properties: np.ndarray) -> List[VanGenuchtenMaterial]:
+    """
+    @param material_properties: Material rows as in SELECTOR.IN
+    @return: K(h) of each material (in order of the rows)
+    """
+
+    return [VanGenuchtenMaterial.from_parameters(i_model, material_row) for material_row in material_properties]
@@ -0,0 +1,113 @@
+import io
+from dataclasses import dataclass, field
+from typing import Dict, Set, Any, Tuple, List, Union, Optional
+
+import pandas as pd
+
+from . import hydrus_utils
+from .file_processing.atmosph_in_processor import AtmosphInProcessor
+from .file_processing.meteo_in_processor import MeteoInProcessor
+from .file_processing.profile_dat_processor import ProfileDatProcessor
+from .file_processing.selector_in_processor import SelectorInProcessor
+from ..unit_manager import LengthUnit
+
+SELECTOR_IN = "selector.in"
+PROFILE_DAT = "profile.dat"
+ATMOSPH_IN = "atmosph.in"
+METEO_IN = "meteo.in"
+
+
+@dataclass
+class HydrusModel:
+    """
+    In-memory view of input files of a Hydrus model. Each file is read once (when first accessed) into a text buffer
+    which the file processors work on, parsed values are kept until the file is modified. Modified files are written
+    back with a single write each by flush().
+    """
+
+    model_dir: str
+    _buffers: Dict[str, io.StringIO] = field(default_factory=dict)
+    _dirty_files: Set[str] = field(default_factory=set)
+    _parsed: Dict[Tuple[str, str], Any] = field(default_factory=dict)
+
+    def has_file(self, file_name: str) -> bool:
+        return self.__get_buffer(file_name) is not None
+
+    def read_file(self, file_name: str) -> Optional[io.StringIO]:
+        """
+        @return: Buffer with the file content (rewound), None if the model does not contain the file
+        """
+        return self.__get_buffer(file_name)
+
+    def edit_file(self, file_name: str) -> Optional[io.StringIO]:
+        """
+        @return: Buffer with the file content (rewound) - its content is written to the file by flush()
+        """
+        buffer = self.__get_buffer(file_name)
+        if buffer is not None:
+            self._dirty_files.add(file_name.lower())
+            self._parsed = {key: value for key, value in self._parsed.items() if key[0] != file_name.lower()}
+        return buffer
+
+    def flush(self) -> None:
+        for file_name in sorted(self._dirty_files):
+            file_path = self._buffers[file_name].name
+            with open(file_path, 'w', encoding='utf-8') as fp:
+                fp.write(self._buffers[file_name].getvalue())
+        self._dirty_files.clear()
+
+    # SELECTOR.IN
+    def get_length_unit(self) -> LengthUnit:
+        return self.__parse(SELECTOR_IN, "length_unit", lambda fp: SelectorInProcessor(fp).get_model_length())
+
+    def get_waterflow_config(self) -> Dict:
+        return self.__parse(SELECTOR_IN, "waterflow_config", lambda fp: SelectorInProcessor(fp).read_waterflow_config())
+
+    def get_material_properties(self) -> pd.DataFrame:
+        return self.__parse(SELECTOR_IN, "material_properties",
+                            lambda fp: SelectorInProcessor(fp).read_material_properties())
+
+    def update_initial_and_final_step(self, first_day: float, last_day: float) -> None:
+        SelectorInProcessor(self.__edit_required(SELECTOR_IN)).update_initial_and_final_step(first_day, last_day)
+
+    # PROFILE.DAT
+    def get_profile_depth(self) -> float:
+        return self.__parse(PROFILE_DAT, "profile_depth", lambda fp: ProfileDatProcessor(fp).read_profile_depth())
+
+    def swap_pressure(self, pressure: Union[List[float], float]) -> None:
+        ProfileDatProcessor(self.__edit_required(PROFILE_DAT)).swap_pressure(pressure)
+
+    # ATMOSPH.IN, METEO.IN
+    def truncate_atmosph(self, data_start_idx: int, data_count: int) -> Tuple[float, float]:
+        return AtmosphInProcessor(self.__edit_required(ATMOSPH_IN)).truncate_file(data_start_idx, data_count)
+
+    def truncate_meteo(self, data_start_idx: int, data_count: int) -> Tuple[float, float]:
+        return MeteoInProcessor(self.__edit_required(METEO_IN)).truncate_file(data_start_idx, data_count)
+
+    def __get_buffer(self, file_name: str) -> Optional[io.StringIO]:
+        file_name = file_name.lower()
+        if file_name not in self._buffers:
+            file_path = hydrus_utils.find_hydrus_file_path(self.model_dir, file_name=file_name)
+            if file_path is None:
+                return None
+            with open(file_path, 'r', encoding='utf-8') as fp:
+                buffer = io.StringIO(fp.read())
+            buffer.name = file_path  # processors report errors with the file name
+            self._buffers[file_name] = buffer
+        buffer = self._buffers[file_name]
+        buffer.seek(0)
+        return buffer
+
+    def __edit_required(self, file_name: str) -> io.StringIO:
+        buffer = self.edit_file(file_name)
+        if buffer is None:
+            raise FileNotFoundError(f"Hydrus model {self.model_dir} does not contain {file_name.upper()} file!")
+        return buffer
+
+    def __parse(self, file_name: str, key: str, parse_func) -> Any:
+        if (file_name, key) not in self._parsed:
+            buffer = self.read_file(file_name)
+            if buffer is None:
+                raise FileNotFoundError(f"Hydrus model {self.model_dir} does not contain {file_name.upper()} file!")
+            self._parsed[(file_name, key)] = parse_func(buffer)
+        return self._parsed[(file_name, key)]
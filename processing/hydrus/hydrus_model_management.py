@@ -4,17 +4,17 @@ import shutil
 from typing import Dict, Tuple
 
 from . import hydrus_utils
-from .file_processing.atmosph_in_processor import AtmosphInProcessor
-from .file_processing.meteo_in_processor import MeteoInProcessor
 from .file_processing.nod_inf_out_processor import NodInfOutProcessor
-from .file_processing.profile_dat_processor import ProfileDatProcessor
-from .file_processing.selector_in_processor import SelectorInProcessor
+from .hydrus_model import HydrusModel
 from .hydrus_profile_pressure_calculator import calculate_pressure_for_hydrus_model, calculate_hydrostatic_pressure
 from .hydrus_utils import HYDRUS_PROPER_CASING
-from ..local_fs_configuration import local_paths
+from ..local_fs_configuration import local_paths, model_cloning, directory_index
 from ..local_fs_configuration.feedback_loop_file_management import find_previous_simulation_step_dir
 from ..unit_manager import LengthUnit
 
+WEATHER_FILES = ["atmosph.in", "meteo.in"]
+TRUNCATED_RECORD_DAYS_FILENAME = "record_days.json"
+
 
 def prepare_model_for_next_iteration(project_id: str, ref_hydrus_id: str, compound_hydrus_id: str, spin_up: int):
     ref_hydrus_dir = local_paths.get_hydrus_model_path(project_id, ref_hydrus_id,
@@ -33,31 +33,36 @@ def prepare_model_for_next_iteration(project_id: str, ref_hydrus_id: str, compou
     __create_temporary_model(ref_hydrus_dir=ref_hydrus_dir,
                              prev_hydrus_dir=prev_hydrus_dir,
                              new_hydrus_dir=new_hydrus_dir,
+                             step_cache_dir=local_paths.get_hydrus_step_cache_dir(project_id, ref_hydrus_id,
+                                                                                  step, spin_up),
                              project_metadata=project_metadata,
                              step=step,
                              spin_up=spin_up)
 
 
-def update_bottom_pressure(project_id: str,
-                           hydrus_id: str,
+def load_model(project_id: str, hydrus_id: str) -> HydrusModel:
+    return HydrusModel(local_paths.get_hydrus_model_path(project_id, hydrus_id, simulation_mode=True))
+
+
+def update_bottom_pressure(hydrus_model: HydrusModel,
+                           project_id: str,
                            hydrus_profile_depth: float,
                            water_avg_depth: float,
                            hydrus_unit: LengthUnit) -> None:
-    model_dir = local_paths.get_hydrus_model_path(project_id, hydrus_id, simulation_mode=True)
+    """
+    Updates pressure in PROFILE.DAT of the model (in memory - written by hydrus_model.flush()).
+    """
 
     if not find_previous_simulation_step_dir(project_id):
-        new_pressure_in_profile = calculate_hydrostatic_pressure(model_dir, water_avg_depth, hydrus_unit)
+        new_pressure_in_profile = calculate_hydrostatic_pressure(hydrus_model, water_avg_depth, hydrus_unit)
     else:
         water_depth_in_profile = hydrus_profile_depth - water_avg_depth  # FIXME: Sign correction?
-        new_pressure_in_profile = calculate_pressure_for_hydrus_model(model_dir,
+        new_pressure_in_profile = calculate_pressure_for_hydrus_model(hydrus_model,
                                                                       water_depth_in_profile=water_depth_in_profile)
-    profile_dat_path = hydrus_utils.find_hydrus_file_path(model_dir, file_name="profile.dat")
-    with open(profile_dat_path, 'r+', encoding="utf-8") as fp:
-        ProfileDatProcessor(fp).swap_pressure(new_pressure_in_profile)
+    hydrus_model.swap_pressure(new_pressure_in_profile)
 
 
-def get_profile_depth(project_id: str, hydrus_id: str) -> Tuple[float, LengthUnit]:
-    model_dir = local_paths.get_hydrus_model_path(project_id, hydrus_id, simulation_mode=True)
+def get_profile_depth(hydrus_model: HydrusModel) -> Tuple[float, LengthUnit]:
     # hydrus_info_file_path = hydrus_utils.find_hydrus_file_path(model_dir, file_name="hydrus1d.dat")
     # with open(hydrus_info_file_path, 'r', encoding='utf-8') as fp:
     #     unit = None
@@ -68,64 +73,85 @@ def get_profile_depth(project_id: str, hydrus_id: str) -> Tuple[float, LengthUni
     #         elif line.startswith("ProfileDepth"):
     #             depth = float(line.split('=')[1])
     #     return depth, LengthUnit(unit)
-    profile_file_path = hydrus_utils.find_hydrus_file_path(model_dir, file_name="profile.dat")
-    with open(profile_file_path, 'r', encoding='utf-8') as fp:
-        profile_dat_processor = ProfileDatProcessor(fp)
-        profile_depth = profile_dat_processor.read_profile_depth()
-
-    selector_file_path = hydrus_utils.find_hydrus_file_path(model_dir, file_name="selector.in")
-    with open(selector_file_path, 'r', encoding='utf-8') as fp:
-        selector_in_processor = SelectorInProcessor(fp)
-        depth_unit = selector_in_processor.get_model_length()
+    return hydrus_model.get_profile_depth(), hydrus_model.get_length_unit()
 
-    return profile_depth, depth_unit
 
-
-def __create_temporary_model(ref_hydrus_dir: str, prev_hydrus_dir: str, new_hydrus_dir: str,
+def __create_temporary_model(ref_hydrus_dir: str, prev_hydrus_dir: str, new_hydrus_dir: str, step_cache_dir: str,
                              project_metadata: Dict, step: int, spin_up: int) -> None:
     shutil.rmtree(new_hydrus_dir, ignore_errors=True)
-    shutil.copytree(ref_hydrus_dir, new_hydrus_dir)
+    model_cloning.clone_tree(ref_hydrus_dir, new_hydrus_dir)
+
+    # All input files are modified in memory and written once at the end
+    hydrus_model = HydrusModel(new_hydrus_dir)
 
     # Initial conditions from previous iteration
     if prev_hydrus_dir:
         prev_iter_nod_inf_path = hydrus_utils.find_hydrus_file_path(prev_hydrus_dir, file_name="nod_inf.out")
         new_iter_nod_inf_path = (hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="nod_inf.out")
                                  or os.path.join(new_hydrus_dir, HYDRUS_PROPER_CASING["nod_inf.out"]))
-        shutil.copy(prev_iter_nod_inf_path, new_iter_nod_inf_path)
+        shutil.copyfile(prev_iter_nod_inf_path, new_iter_nod_inf_path)
         with open(prev_iter_nod_inf_path, 'r', encoding='utf-8') as fp:
             prev_node_pressure = NodInfOutProcessor(fp).read_node_pressure()
 
-        profile_dat_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="profile.dat")
-        with open(profile_dat_path, 'r+', encoding='utf-8') as fp:
-            ProfileDatProcessor(fp).swap_pressure(prev_node_pressure)
+        hydrus_model.swap_pressure(prev_node_pressure)
 
         prev_iter_t_level_out = hydrus_utils.find_hydrus_file_path(prev_hydrus_dir, file_name="t_level.out")
         new_t_level_out = (hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="t_level.out")
                            or os.path.join(new_hydrus_dir, HYDRUS_PROPER_CASING["t_level.out"]))
-        shutil.copy(prev_iter_t_level_out, new_t_level_out)
+        shutil.copyfile(prev_iter_t_level_out, new_t_level_out)
+        directory_index.invalidate(new_hydrus_dir)
 
-    # Crop packages to match Modflow timestep
+    # Crop packages to match Modflow timestep - weather files are the same for all models created from the reference
     first_step, step_count = __get_hydrus_time_range(project_metadata, step, spin_up)
-
-    atmosph_in_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="atmosph.in")
-    with open(atmosph_in_path, 'r+', encoding='utf-8') as fp:
-        atmo_first_jul_day, atmo_last_jul_day = AtmosphInProcessor(fp).truncate_file(first_step, step_count)
-
-    meteo_in_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="meteo.in")
-    with open(meteo_in_path, 'r+', encoding='utf-8') as fp:
-        meteo_first_jul_day, meteo_last_jul_day = MeteoInProcessor(fp).truncate_file(first_step, step_count)
-
-    if atmo_first_jul_day != meteo_first_jul_day or atmo_last_jul_day != meteo_last_jul_day:
-        raise RuntimeError(f"ATMPOSH.IN and METEO.IN record ranges do not match: "
-                           f"ATMOSPH.IN: ({atmo_first_jul_day}, {atmo_last_jul_day}) "
-                           f"METEO.IN: ({meteo_first_jul_day}, {meteo_last_jul_day})")
-
-    first_record_day = meteo_first_jul_day
-    last_record_day = meteo_last_jul_day
-    selector_in_path = hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name="selector.in")
-    with open(selector_in_path, 'r+', encoding='utf-8') as fp:
-        selector_in_processor = SelectorInProcessor(fp)
-        selector_in_processor.update_initial_and_final_step(first_record_day, last_record_day)
+    first_record_day, last_record_day = __get_truncated_weather_files(ref_hydrus_dir, step_cache_dir,
+                                                                      first_step, step_count)
+    for file_name in WEATHER_FILES:
+        model_cloning.replace_with_clone(os.path.join(step_cache_dir, HYDRUS_PROPER_CASING[file_name]),
+                                         hydrus_utils.find_hydrus_file_path(new_hydrus_dir, file_name=file_name))
+
+    hydrus_model.update_initial_and_final_step(first_record_day, last_record_day)
+    hydrus_model.flush()
+
+
+def __get_truncated_weather_files(ref_hydrus_dir: str, step_cache_dir: str,
+                                  first_step: int, step_count: int) -> Tuple[float, float]:
+    """
+    Truncates ATMOSPH.IN and METEO.IN of the reference model to the step records once - the files are kept in
+    the step cache directory (written atomically, as models may be prepared concurrently).
+
+    @return: First and last julian day of the step records
+    """
+
+    record_days_path = os.path.join(step_cache_dir, TRUNCATED_RECORD_DAYS_FILENAME)
+    if not os.path.isfile(record_days_path):
+        os.makedirs(step_cache_dir, exist_ok=True)
+
+        # Truncated in memory only - reference model stays untouched
+        ref_model = HydrusModel(ref_hydrus_dir)
+        atmo_first_jul_day, atmo_last_jul_day = ref_model.truncate_atmosph(first_step, step_count)
+        meteo_first_jul_day, meteo_last_jul_day = ref_model.truncate_meteo(first_step, step_count)
+
+        if atmo_first_jul_day != meteo_first_jul_day or atmo_last_jul_day != meteo_last_jul_day:
+            raise RuntimeError(f"ATMPOSH.IN and METEO.IN record ranges do not match: "
+                               f"ATMOSPH.IN: ({atmo_first_jul_day}, {atmo_last_jul_day}) "
+                               f"METEO.IN: ({meteo_first_jul_day}, {meteo_last_jul_day})")
+
+        for file_name in WEATHER_FILES:
+            __write_atomically(os.path.join(step_cache_dir, HYDRUS_PROPER_CASING[file_name]),
+                               ref_model.read_file(file_name).getvalue())
+        # Written last - marks the cache entry as complete
+        __write_atomically(record_days_path, json.dumps([meteo_first_jul_day, meteo_last_jul_day]))
+
+    with open(record_days_path, 'r', encoding='utf-8') as fp:
+        first_record_day, last_record_day = json.load(fp)
+    return first_record_day, last_record_day
+
+
+def __write_atomically(file_path: str, content: str) -> None:
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fp:
+        fp.write(content)
+    os.replace(tmp_path, file_path)
 
 
 def __get_hydrus_time_range(project_metadata: Dict, step: int, spin_up: int) -> Tuple[int, int]:
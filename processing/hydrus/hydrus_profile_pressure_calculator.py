@@ -1,15 +1,23 @@
+from dataclasses import dataclass
+from typing import Sequence, List
+
 import numpy as np
-from pandas import read_csv
-from scipy.optimize import root_scalar
 import phydrus as ph
+from scipy.optimize import brentq
 
-from . import hydrus_utils
-from .file_processing.selector_in_processor import SelectorInProcessor
+from . import hydrus_utils, hydraulic_conductivity
+from .hydraulic_conductivity import VanGenuchtenMaterial
+from .hydrus_model import HydrusModel
 from .. import unit_manager
 from ..unit_manager import LengthUnit
 
+# Pressure head range of the profile update
+PRESSURE_HEAD_MIN = -1000.
+PRESSURE_HEAD_MAX = 100.
+
 
-def calculate_hydrostatic_pressure(hydrus_root_dir: str, water_depth_in_profile: float, hydrus_unit: LengthUnit):
+def calculate_hydrostatic_pressure(hydrus_model: HydrusModel, water_depth_in_profile: float, hydrus_unit: LengthUnit):
+    hydrus_root_dir = hydrus_model.model_dir
     # Contains DF with x, h (pressure)
     profile = ph.profile.profile_from_file(hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="profile.dat"),
                                            ws="")
@@ -22,8 +30,27 @@ def calculate_hydrostatic_pressure(hydrus_root_dir: str, water_depth_in_profile:
     return pressure.tolist()
 
 
+@dataclass
+class ProfileFlowState:
+    """
+    Flow in the soil profile of a Hydrus model at the end of the last simulation step, with the new pressure head
+    at the bottom - input of the pressure profile update.
+    """
+
+    node_depths: np.ndarray
+    node_material_ids: np.ndarray  # 1-based index into material_properties
+    node_pressure: np.ndarray
+    node_conductivity: np.ndarray
+    node_flux: np.ndarray
+    bottom_flux: float
+    bottom_pressure: float
+    i_model: int
+    material_properties: np.ndarray  # material rows as in SELECTOR.IN
+
+
 # Credit to Adam Szymkiewicz
-def calculate_pressure_for_hydrus_model(hydrus_root_dir: str, water_depth_in_profile: float):
+def read_profile_flow_state(hydrus_model: HydrusModel, water_depth_in_profile: float) -> ProfileFlowState:
+    hydrus_root_dir = hydrus_model.model_dir
     time_inf2 = ph.read_tlevel(hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="t_level.out"))
     rval2 = time_inf2["vBot"].to_numpy()
 
@@ -34,170 +61,102 @@ def calculate_pressure_for_hydrus_model(hydrus_root_dir: str, water_depth_in_pro
     if not (isinstance(perlen, float) or isinstance(perlen, int)):
         raise RuntimeError(f"Model {hydrus_root_dir} contains only initial profile nodes data in NOD_INF.OUT file!")
 
-    selector_in_path = hydrus_utils.find_hydrus_file_path(hydrus_root_dir, file_name="selector.in")
-    with open(selector_in_path, 'r', encoding='utf-8') as fp:
-        selector_processor = SelectorInProcessor(fp)
-        waterflow_config = selector_processor.read_waterflow_config()
-        material_properties = selector_processor.read_material_properties()
-
-    qbot = rval2[-1]  # bottom flux from the last Hydrus time step
-    kold = nod_inf2[perlen].K.to_numpy()
-    qold = nod_inf2[perlen].Flux.to_numpy()
-    matid = profile["Mat"]
-    h2new = nod_inf2[perlen].Head.to_numpy()
-    h2new[-1] = water_depth_in_profile  # new pressure head at the bottom
-    h_low = h2new[-1]
-    k_low = kold[-1]
-
-    for idx in range(len(h2new) - 2, 0, -1):
-        qold1 = 0.5 * (qold[idx] + qold[idx + 1])
-        # check if the profile update should be terminated
-        if qold1 * qbot < 0:
-            # flux changes direction
-            break
-        qmax = max(abs(qold1), abs(qbot))
-        if abs(qold1 - qbot) > (1e-12 + 0.1 * qmax):
-            # flux value significantly different from the value in the saturated zone
-            break
-
-        dz = abs(profile["x"].iloc[idx + 1] - profile["x"].iloc[idx])
-        midx = matid.iloc[idx]
-        iModel = waterflow_config["iModel"]
-        ThR = material_properties.iloc[midx - 1, 0]
-        ThS = material_properties.iloc[midx - 1, 1]
-        alpha = material_properties.iloc[midx - 1, 2]
-        nvg = material_properties.iloc[midx - 1, 3]
-        ks = material_properties.iloc[midx - 1, 4]
-        tau = material_properties.iloc[midx - 1, 5]
-
-        args = [qbot, h_low, k_low, dz, iModel, ThR, ThS, alpha, nvg, ks, tau]
-        targs = tuple(args)
-
-        hmin = -1000.
-        kmin = __kh(hmin, iModel, ThR, ThS, alpha, nvg, ks, tau)
-        fluxmax = -0.5 * (kmin + k_low) * ((hmin - h_low) / dz + 1)
-        hmax = 100.
-        kmax = ks
-        fluxmin = -0.5 * (kmax + k_low) * ((hmax - h_low) / dz + 1)
+    return ProfileFlowState(node_depths=profile["x"].to_numpy(dtype=np.float64),
+                            node_material_ids=profile["Mat"].to_numpy(dtype=np.int64),
+                            node_pressure=nod_inf2[perlen].Head.to_numpy(dtype=np.float64),
+                            node_conductivity=nod_inf2[perlen].K.to_numpy(dtype=np.float64),
+                            node_flux=nod_inf2[perlen].Flux.to_numpy(dtype=np.float64),
+                            bottom_flux=float(rval2[-1]),  # bottom flux from the last Hydrus time step
+                            bottom_pressure=water_depth_in_profile,
+                            i_model=hydrus_model.get_waterflow_config()["iModel"],
+                            material_properties=hydrus_model.get_material_properties().to_numpy(dtype=np.float64))
+
+
+def calculate_pressure_for_hydrus_model(hydrus_model: HydrusModel, water_depth_in_profile: float) -> np.ndarray:
+    flow_state = read_profile_flow_state(hydrus_model, water_depth_in_profile)
+    return solve_pressure_profile(flow_state, __get_materials(flow_state))
+
+
+def __get_materials(flow_state: ProfileFlowState) -> List[VanGenuchtenMaterial]:
+    return hydraulic_conductivity.get_materials(flow_state.i_model, flow_state.material_properties)
+
+
+def solve_pressure_profile(flow_state: ProfileFlowState, materials: Sequence[VanGenuchtenMaterial]) -> np.ndarray:
+    """
+    Sets the new pressure head at the bottom node and updates pressure of the nodes above it (bottom-up) to match
+    steady flow with the bottom flux - until the flux in the profile changes direction or differs significantly.
+
+    @param materials: Conductivity functions of the profile materials
+    @return: New pressure head of the nodes
+    """
+
+    qbot = flow_state.bottom_flux
+    h2new = flow_state.node_pressure.copy()
+    h2new[-1] = flow_state.bottom_pressure  # new pressure head at the bottom
+    h_low = float(h2new[-1])
+    k_low = float(flow_state.node_conductivity[-1])
+    first_kept_idx = __get_first_kept_node_index(flow_state.node_flux, qbot)
+
+    # Plain Python floats - the loop is sequential, NumPy scalars would only slow it down
+    dzs = np.abs(np.diff(flow_state.node_depths)).tolist()
+    node_materials = [materials[material_id - 1] for material_id in flow_state.node_material_ids.tolist()]
+    # conductivity at the lowest pressure head considered, evaluated once per material
+    k_mins = [material.conductivity(PRESSURE_HEAD_MIN) for material in materials]
+    node_k_mins = [k_mins[material_id - 1] for material_id in flow_state.node_material_ids.tolist()]
+    hmin = PRESSURE_HEAD_MIN
+    hmax = PRESSURE_HEAD_MAX
+    for idx in range(len(h2new) - 2, first_kept_idx, -1):
+        dz = dzs[idx]
+        material = node_materials[idx]
         hz = h_low - dz
         if abs(qbot) < 1e-12:
             # almost hydrostatic
             h_up = hz
         elif qbot < 0:
             # downward flux
+            fluxmin = -0.5 * (material.ks + k_low) * ((hmax - h_low) / dz + 1)
             if qbot < fluxmin:
                 h_up = hmax
             else:
-                my_bracket = [hz, hmax]
-                sol = root_scalar(__flux_bal, args=targs, bracket=my_bracket)
-                print(sol.root, sol.converged, sol.flag)
-                h_up = sol.root
+                h_up = __find_flux_balance(material, qbot, h_low, k_low, dz, hz, hmax)
         else:
             # upward flux
+            fluxmax = -0.5 * (node_k_mins[idx] + k_low) * ((hmin - h_low) / dz + 1)
             if qbot > fluxmax:
                 h_up = hmin
             else:
-                my_bracket = [hmin, hz]
-                sol = root_scalar(__flux_bal, args=targs, bracket=my_bracket)
-                print(sol.root, sol.converged, sol.flag)
-                h_up = sol.root
+                h_up = __find_flux_balance(material, qbot, h_low, k_low, dz, hmin, hz)
         h2new[idx] = h_up
         h_low = h_up
-        k_low = __kh(h_low, iModel, ThR, ThS, alpha, nvg, ks, tau)
+        k_low = material.conductivity(h_low)
     return h2new
 
 
-# Credit to Adam Szymkiewicz
-def __kh(h, *args):
-    # calculates hydraulic conductivity as a function of pressure head
-    # required to modify Hydrus pressure profiles after each Modflow period
-    iModel = args[0]
-    Qr = args[1]
-    Qs = args[2]
-    Alfa = args[3]
-    n = args[4]
-    Ks = max(args[5], 1.0e-37)
-    BPar = args[6]
-
-    if iModel not in (0, 1, 3):
-        raise RuntimeError(f"Not implemented: iModel {iModel}!")
-
-    PPar = 2
-    if iModel == 0 or iModel == 3:
-        Qm = Qs
-        Qa = Qr
-        Qk = Qs
-        Kk = Ks
-    elif iModel == 1:
-        # DEAD CODE
-        ###
-        lAltern = False
-        if not lAltern:
-            Qm = args[7]
-            Qa = args[8]
-            Qk = args[9]
-            Kk = args[10]
-        ###
-        else:
-            Qm = Qs
-            Qa = Qr
-            Qk = Qs
-            Kk = Ks
-            Alfa = args[9]
-            n = args[10]
-
-    if iModel == 3:
-        Qm = args[7]
-    m = 1.0 - 1.0 / n
-
-    # DEAD CODE
-    ###
-    lUnbound = False
-    if lUnbound:
-        m = args[6]
-        BPar = 0.5
-    ###
-
-    HMin = -1.0e300 ** (1.0 / n) / max(Alfa, 1.0)
-    HH = max(h, HMin)
-    Qees = min((Qs - Qa) / (Qm - Qa), 0.999999999999999)
-    Qeek = min((Qk - Qa) / (Qm - Qa), Qees)
-    Hs = -1.0 / Alfa * (Qees ** (-1.0 / m) - 1.0) ** (1.0 / n)
-    Hk = -1.0 / Alfa * (Qeek ** (-1.0 / m) - 1.0) ** (1.0 / n)
-    if h < Hk:
-        if not lUnbound:
-            Qee = (1.0 + (-Alfa * HH) ** n) ** (-m)
-            Qe = (Qm - Qa) / (Qs - Qa) * Qee
-            Qek = (Qm - Qa) / (Qs - Qa) * Qeek
-            FFQ = 1.0 - (1.0 - Qee ** (1.0 / m)) ** (-m)
-            FFQk = 1.0 - (1.0 - Qeek ** (1.0 / m)) ** (-m)
-            if FFQ <= 0.0:
-                FFQ = m * Qee ** (1.0 / m)
-            Kr = (Qe / Qek) ** BPar * (FFQ / FFQk) ** PPar * Kk / Ks
-            if iModel == 0:
-                Kr = Qe ** BPar * FFQ ** PPar
-            return max(Ks * Kr, 1.0e-37)
-        # DEAD CODE
-        ###
-        else:
-            raise RuntimeError("Not implemented case!")
-        ###
-    if Hk <= h < Hs:
-        Kr = (1.0 - Kk / Ks) / (Hs - Hk) * (h - Hs) + 1
-        return Ks * Kr
-    if h >= Hs:
-        return Ks
+def __get_first_kept_node_index(node_flux: np.ndarray, qbot: float) -> int:
+    """
+    The profile is updated from the bottom up to the first node where the flux is significantly different
+    from the value in the saturated zone (or changes direction).
 
+    @return: Index of the lowest node (above the bottom node) kept unchanged, 0 if there is none
+    """
 
-# Credit to Adam Szymkiewicz
-def __flux_bal(h, *args):
-    # calculates residuum for steady flow equation
-    # required to modify Hydrus pressure profiles after each Modflow period
-    q = args[0]  # flux (negative downward)
-    h0 = args[1]  # pressure at lower node
-    k0 = args[2]  # hyd. cond. at lower node
-    dz = args[3]  # node spacing
-    my_kh = __kh(h, *args[4:])
-    kaver = 0.5 * (k0 + my_kh)
-    bal = q + kaver * ((h - h0) / dz + 1)
-    return bal
+    qold1 = 0.5 * (node_flux[:-1] + node_flux[1:])
+    qmax = np.maximum(np.abs(qold1), abs(qbot))
+    stops = (qold1 * qbot < 0) | (np.abs(qold1 - qbot) > (1e-12 + 0.1 * qmax))
+    stops[0] = True  # top node is never updated
+    return int(np.flatnonzero(stops)[-1])
+
+
+def __find_flux_balance(material: VanGenuchtenMaterial, q: float, h0: float, k0: float, dz: float,
+                        h_a: float, h_b: float) -> float:
+    """
+    Finds pressure head h in [h_a, h_b] for which steady flow between the lower node (h0, k0) and the node above
+    carries flux q (negative downward).
+    """
+
+    def flux_bal(h: float) -> float:
+        # residuum for steady flow equation
+        return q + 0.5 * (k0 + material.conductivity(h)) * ((h - h0) / dz + 1)
+
+    # Compiled Brent's method - K(h) may be discontinuous at the air-entry value, so bracketing is required
+    return brentq(flux_bal, h_a, h_b)
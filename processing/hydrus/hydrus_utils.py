@@ -2,9 +2,9 @@ import logging
 import os
 from collections import defaultdict
 from typing import List, Union, Optional, Dict, Tuple, Set
-from zipfile import ZipFile
 
-from ..local_fs_configuration import path_constants
+from .. import upload_extraction
+from ..local_fs_configuration import path_constants, directory_index
 from ..model_exceptions import HydrusMissingFileError
 
 EXPECTED_INPUT_FILES = ["SELECTOR.IN", "ATMOSPH.IN"]
@@ -69,41 +69,25 @@ def get_hydrus_mapping_for_transfer_to_modflow(shapes_to_hydrus: Dict[str, Union
 
 
 def validate_model(hydrus_archive, validation_dir: os.PathLike):
-    hydrus_path = os.path.join(validation_dir, hydrus_archive.filename)
-    hydrus_archive.save(hydrus_path)
-    with ZipFile(hydrus_path, 'r') as archive:
-        archive.extractall(validation_dir)
-    os.remove(hydrus_path)
+    # Casing and line endings are fixed while the archive is extracted
+    upload_extraction.extract_uploaded_archive(hydrus_archive, validation_dir,
+                                               member_handler=__fix_hydrus_member)
     input_files = get_hydrus_input_files(validation_dir)
     for expected_file in EXPECTED_INPUT_FILES:
         if expected_file.casefold() not in input_files:
             raise HydrusMissingFileError(description=f"Invalid Hydrus model - validation detected "
                                                      f"missing file: {expected_file}")
-    __fix_hydrus_project(validation_dir)
 
 
 # Files: PROFILE.DAT, etc.
 def find_hydrus_file_path(hydrus_base_dir: str, file_name: str) -> Optional[str]:
-    try:
-        return os.path.join(hydrus_base_dir,
-                            next(f for f in os.listdir(hydrus_base_dir) if f.lower() == file_name.lower()))
-    except StopIteration:
-        return None
-
-
-def __fix_hydrus_project(hydrus_base_dir: str):
-    for file in os.listdir(hydrus_base_dir):
-        lowercase_file = file.lower()
-        if lowercase_file not in HYDRUS_PROPER_CASING:
-            logging.info(f"Skipping case-fixing for file: {file}")
-            continue
-
-        old_file = os.path.join(hydrus_base_dir, file)
-        new_file = os.path.join(hydrus_base_dir, HYDRUS_PROPER_CASING[lowercase_file])
-        os.rename(old_file, new_file)
-        with open(new_file, 'r+b') as fp:
-            original_content = fp.read()
-            lf_separated_lines = original_content.replace(b'\r\n', b'\n')
-            fp.seek(0)
-            fp.write(lf_separated_lines)
-            fp.truncate()
+    found_file = directory_index.find_file(hydrus_base_dir, file_name)
+    return os.path.join(hydrus_base_dir, found_file) if found_file else None
+
+
+def __fix_hydrus_member(member_name: str) -> Tuple[str, bool]:
+    lowercase_file = member_name.lower()
+    if lowercase_file not in HYDRUS_PROPER_CASING:
+        logging.info(f"Skipping case-fixing for file: {member_name}")
+        return member_name, False
+    return HYDRUS_PROPER_CASING[lowercase_file], True
@@ -0,0 +1,68 @@
+import numpy as np
+
+from processing.hydrus import hydraulic_conductivity
+from processing.hydrus.hydrus_profile_pressure_calculator import ProfileFlowState, solve_pressure_profile, \
+    PRESSURE_HEAD_MIN, PRESSURE_HEAD_MAX
+
+# thr, ths, Alfa, n, Ks, l
+MATERIALS = np.array([[0.045, 0.43, 0.145, 2.68, 712.8, 0.5],
+                      [0.078, 0.43, 0.036, 1.56, 24.96, 0.5]])
+# Roots are within the brentq tolerance (2e-12 + 4 eps |h|) of the exact flux balance
+FLUX_RELATIVE_TOLERANCE = 1e-6
+PROFILE_COUNT = 20
+
+
+def __create_flow_states(profile_count: int, node_count: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    node_depths = -np.linspace(0, 300, node_count)
+    node_material_ids = np.where(np.arange(node_count) < node_count // 2, 1, 2)
+    materials = hydraulic_conductivity.get_materials(0, MATERIALS)
+
+    flow_states = {}
+    for profile_idx in range(profile_count):
+        # downward and upward fluxes of different magnitudes
+        bottom_flux = float(rng.choice([-0.5, -0.01, 0.003, 0.2]) * rng.uniform(0.5, 2))
+        node_pressure = -150 - node_depths + rng.normal(0, 3, node_count)
+        node_conductivity = np.array([materials[material_id - 1].conductivity(h)
+                                      for h, material_id in zip(node_pressure, node_material_ids)])
+        node_flux = bottom_flux * (1 + rng.normal(0, rng.choice([0.0, 0.01]), node_count))
+        flow_states[profile_idx] = ProfileFlowState(node_depths=node_depths,
+                                                    node_material_ids=node_material_ids,
+                                                    node_pressure=node_pressure,
+                                                    node_conductivity=node_conductivity,
+                                                    node_flux=node_flux,
+                                                    bottom_flux=bottom_flux,
+                                                    # saturated bottom (above the air-entry value) and unsaturated
+                                                    bottom_pressure=float(rng.uniform(-40, 50)),
+                                                    i_model=0,
+                                                    material_properties=MATERIALS)
+    return flow_states
+
+
+def test_updated_nodes_carry_bottom_flux():
+    flow_states = __create_flow_states(profile_count=PROFILE_COUNT, node_count=201)
+    materials = hydraulic_conductivity.get_materials(0, MATERIALS)
+
+    for profile_idx, flow_state in flow_states.items():
+        new_pressure = solve_pressure_profile(flow_state, materials)
+        assert new_pressure[-1] == flow_state.bottom_pressure
+        assert new_pressure[0] == flow_state.node_pressure[0]
+        qbot = flow_state.bottom_flux
+        node_materials = [materials[material_id - 1] for material_id in flow_state.node_material_ids]
+        # balance between updated nodes, the lowest one uses K of the previous step at the bottom
+        for idx in range(len(new_pressure) - 3, 0, -1):
+            h, h0 = new_pressure[idx], new_pressure[idx + 1]
+            if h == flow_state.node_pressure[idx] or not PRESSURE_HEAD_MIN < h < PRESSURE_HEAD_MAX:
+                continue
+            if abs(h - node_materials[idx].hk) < 1e-9:
+                # root at the jump of K(h) at the air-entry value - flux balance changes sign there
+                continue
+            dz = abs(flow_state.node_depths[idx + 1] - flow_state.node_depths[idx])
+            k0 = node_materials[idx + 1].conductivity(h0)
+            flux = -0.5 * (k0 + node_materials[idx].conductivity(h)) * ((h - h0) / dz + 1)
+            assert abs(flux - qbot) <= FLUX_RELATIVE_TOLERANCE * abs(qbot) + 1e-12, \
+                f"Profile {profile_idx}, node {idx}: flux {flux} instead of {qbot}"
+
+
+if __name__ == "__main__":
+    test_updated_nodes_carry_bottom_flux()
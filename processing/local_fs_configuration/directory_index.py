@@ -0,0 +1,142 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Coarsest mtime resolution of the supported filesystems (FAT, SMB and some NFS servers)
+MTIME_GRANULARITY_NS = 2_000_000_000
+
+
+@dataclass
+class _IndexedDirectory:
+    signature: Tuple[int, int]  # inode and mtime of the directory
+    file_names: List[str]  # in os.listdir order
+    by_lowercase_name: Dict[str, str]
+    trusted: bool  # listing is reused while the signature does not change
+    signature_seen_ns: int  # monotonic time when the signature was first seen
+    by_extension: Dict[str, Optional[str]] = field(default_factory=dict)
+
+
+@dataclass
+class DirectoryIndex:
+    """
+    Keeps file names of model directories for the lifetime of the process, so lookups of model files
+    (case-insensitive Hydrus file names, Modflow files by extension) do not list the directory every time.
+    Entries are validated against the directory inode and mtime and are invalidated (or refreshed) explicitly
+    after the writes of the library, their next listing is trusted. A directory changed by someone else (signature
+    changed without an invalidation) may change again without a visible mtime change (coarse mtimes of network
+    mounts) - it is listed on each lookup until its signature stays the same for the mtime granularity. Only
+    the local monotonic clock is used for that, so the clock of the file server does not matter.
+    """
+
+    lookups: int = 0
+    scans: int = 0
+    _entries: Dict[str, _IndexedDirectory] = field(default_factory=dict)
+
+    def find_file(self, dir_path: str, file_name: str) -> Optional[str]:
+        """
+        @return: Name of the file in the directory matching the given name case-insensitively, None if not found
+        """
+        return self._get_entry(dir_path).by_lowercase_name.get(file_name.lower())
+
+    def find_file_with_extension(self, dir_path: str, ext: str) -> Optional[str]:
+        """
+        @return: Name of the first file in the directory ending with ext, None if not found
+        """
+        entry = self._get_entry(dir_path)
+        if ext not in entry.by_extension:
+            entry.by_extension[ext] = next((file for file in entry.file_names if file.endswith(ext)), None)
+        return entry.by_extension[ext]
+
+    def invalidate(self, dir_path: Optional[str] = None) -> None:
+        """
+        @param dir_path: Directory whose content has changed, None invalidates the whole index
+        """
+        if dir_path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(os.path.abspath(dir_path), None)
+
+    def refresh_after_replace(self, file_path: str) -> None:
+        """
+        Keeps the index of the directory valid after an indexed file was atomically replaced by its new version
+        (file names did not change, only the directory mtime).
+        """
+        key = os.path.dirname(os.path.abspath(file_path))
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        if not entry.trusted or os.path.basename(file_path) not in entry.file_names:
+            # listed again (and trusted) on the next lookup
+            del self._entries[key]
+            return
+        stat = os.stat(key)
+        entry.signature = (stat.st_ino, stat.st_mtime_ns)
+        entry.signature_seen_ns = time.monotonic_ns()
+
+    def invalidate_tree(self, root_dir: str) -> None:
+        root_dir = os.path.abspath(root_dir)
+        for dir_path in [dir_path for dir_path in self._entries
+                         if dir_path == root_dir or dir_path.startswith(root_dir + os.sep)]:
+            del self._entries[dir_path]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"lookups": self.lookups, "scans": self.scans, "indexed_directories": len(self._entries)}
+
+    def _get_entry(self, dir_path: str) -> _IndexedDirectory:
+        self.lookups += 1
+        key = os.path.abspath(dir_path)
+        stat = os.stat(key)
+        signature = (stat.st_ino, stat.st_mtime_ns)
+
+        now_ns = time.monotonic_ns()
+        entry = self._entries.get(key)
+        if entry is None:
+            # first listing, or listing after the library changed the directory
+            trusted, signature_seen_ns = True, now_ns
+        elif entry.signature != signature:
+            # changed by someone else - may change again within the same mtime granule
+            trusted, signature_seen_ns = False, now_ns
+        elif entry.trusted:
+            return entry
+        else:
+            # later changes fall into a later mtime granule, so they change the signature
+            trusted = now_ns - entry.signature_seen_ns >= MTIME_GRANULARITY_NS
+            signature_seen_ns = entry.signature_seen_ns
+
+        self.scans += 1
+        file_names = os.listdir(key)
+        by_lowercase_name = {}
+        for file in file_names:
+            by_lowercase_name.setdefault(file.lower(), file)
+        entry = _IndexedDirectory(signature=signature, file_names=file_names, by_lowercase_name=by_lowercase_name,
+                                  trusted=trusted, signature_seen_ns=signature_seen_ns)
+        self._entries[key] = entry
+        return entry
+
+
+DIRECTORY_INDEX = DirectoryIndex()
+
+
+def find_file(dir_path: str, file_name: str) -> Optional[str]:
+    return DIRECTORY_INDEX.find_file(dir_path, file_name)
+
+
+def find_file_with_extension(dir_path: str, ext: str) -> Optional[str]:
+    return DIRECTORY_INDEX.find_file_with_extension(dir_path, ext)
+
+
+def invalidate(dir_path: Optional[str] = None) -> None:
+    DIRECTORY_INDEX.invalidate(dir_path)
+
+
+def invalidate_tree(root_dir: str) -> None:
+    DIRECTORY_INDEX.invalidate_tree(root_dir)
+
+
+def refresh_after_replace(file_path: str) -> None:
+    DIRECTORY_INDEX.refresh_after_replace(file_path)
+
+
+def get_stats() -> Dict[str, int]:
+    return DIRECTORY_INDEX.get_stats()
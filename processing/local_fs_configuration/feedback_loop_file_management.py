@@ -2,7 +2,7 @@ import os
 import shutil
 from typing import Dict, List, Optional
 
-from ..local_fs_configuration import local_paths
+from ..local_fs_configuration import local_paths, model_cloning, snapshot_store
 
 
 def create_per_shape_hydrus_models(project_id: str, used_hydrus_models: Dict[str, List[str]]) -> None:
@@ -16,7 +16,7 @@ def create_per_shape_hydrus_models(project_id: str, used_hydrus_models: Dict[str
                                                                 simulation_ref=True)
             new_model_path = local_paths.get_hydrus_model_path(project_id, hydrus_id,
                                                                simulation_mode=True, shape_id=shape_id)
-            shutil.copytree(ref_hydrus_path, new_model_path)
+            model_cloning.clone_tree(ref_hydrus_path, new_model_path)
 
 
 def pre_configure_iteration(project_id: str) -> None:
@@ -30,10 +30,11 @@ def pre_configure_iteration(project_id: str) -> None:
     step_dir_path = os.path.join(local_paths.get_simulation_dir(project_id), step_dir_name)
     os.makedirs(step_dir_path)
 
-    shutil.copytree(local_paths.get_modflow_dir(project_id, simulation_mode=True),
-                    os.path.join(step_dir_path, "modflow"))
-    shutil.copytree(local_paths.get_hydrus_dir(project_id, simulation_mode=True),
-                    os.path.join(step_dir_path, "hydrus"))
+    # Deduplicated snapshot - only files changed since previous steps take up space
+    snapshot_store.snapshot_step(local_paths.get_snapshots_dir(project_id), step_dir_path, trees={
+        "modflow": local_paths.get_modflow_dir(project_id, simulation_mode=True),
+        "hydrus": local_paths.get_hydrus_dir(project_id, simulation_mode=True)
+    })
 
 
 def find_previous_simulation_step_dir(project_id: str) -> Optional[str]:
@@ -2,7 +2,9 @@ import os
 from typing import Optional
 
 from .path_constants import WORKSPACE_PATH, SIMULATION_DIR, METADATA_FILENAME, MODFLOW_OUTPUT_JSON,\
-    get_feedback_loop_hydrus_name
+    MODFLOW_OUTPUT_NPY, MODFLOW_OUTPUT_NPZ, FEEDBACK_LOOP_OUTPUT_JSON, FEEDBACK_LOOP_OUTPUT_NPY, \
+    FEEDBACK_LOOP_OUTPUT_NPZ, RESULTS_STORE_DIR, SNAPSHOTS_DIR, SHAPE_INDEX_FILENAME, HYDRUS_STEP_CACHE_DIR, \
+    WEATHER_CACHE_DIR, get_feedback_loop_hydrus_name
 
 
 def get_root_dir(project_id: str, simulation_mode: bool) -> str:
@@ -78,3 +80,45 @@ def get_rch_shape_filepath(project_id: str, shape_id: str, simulation_mode: bool
 
 def get_output_json_path(project_id: str) -> str:
     return os.path.join(get_simulation_dir(project_id), MODFLOW_OUTPUT_JSON)
+
+
+def get_output_path(project_id: str, output_format: str) -> str:
+    output_filename = {
+        "json": MODFLOW_OUTPUT_JSON,
+        "npy": MODFLOW_OUTPUT_NPY,
+        "npz": MODFLOW_OUTPUT_NPZ
+    }[output_format]
+    return os.path.join(get_simulation_dir(project_id), output_filename)
+
+
+def get_feedback_loop_output_path(project_id: str, output_format: str) -> str:
+    output_filename = {
+        "json": FEEDBACK_LOOP_OUTPUT_JSON,
+        "npy": FEEDBACK_LOOP_OUTPUT_NPY,
+        "npz": FEEDBACK_LOOP_OUTPUT_NPZ
+    }[output_format]
+    return os.path.join(get_simulation_dir(project_id), output_filename)
+
+
+def get_results_store_dir(project_id: str) -> str:
+    return os.path.join(get_simulation_dir(project_id), RESULTS_STORE_DIR)
+
+
+def get_snapshots_dir(project_id: str) -> str:
+    return os.path.join(get_simulation_dir(project_id), SNAPSHOTS_DIR)
+
+
+def get_shape_index_path(project_id: str) -> str:
+    """
+    @return: Path of the shape index files without extension (<path>.json and <path>.npz)
+    """
+    return os.path.join(get_simulation_dir(project_id), SHAPE_INDEX_FILENAME)
+
+
+def get_hydrus_step_cache_dir(project_id: str, ref_hydrus_id: str, step: int, spin_up: int) -> str:
+    return os.path.join(get_simulation_dir(project_id), HYDRUS_STEP_CACHE_DIR, ref_hydrus_id,
+                        f"step_{step}_spin_up_{spin_up}")
+
+
+def get_weather_cache_dir(project_id: str) -> str:
+    return os.path.join(get_simulation_dir(project_id), WEATHER_CACHE_DIR)
@@ -0,0 +1,59 @@
+import os
+import shutil
+from typing import Set
+
+from . import directory_index
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# ioctl request cloning a whole file (reflink) on Linux - supported e.g. by btrfs and xfs
+__FICLONE = 0x40049409
+
+__reflink_unsupported_devices: Set[int] = set()
+
+
+def clone_tree(src_dir: str, dst_dir: str) -> None:
+    """
+    Replacement of shutil.copytree for model directories. Files are reflinked (copy-on-write) if the filesystem
+    supports it, otherwise copied. Files are never hardlinked - the solvers write files of the model directories
+    in place, which would modify every linked copy.
+    """
+    shutil.copytree(src_dir, dst_dir, copy_function=__clone_file)
+    directory_index.invalidate_tree(dst_dir)
+
+
+def replace_with_clone(src: str, dst: str) -> None:
+    """
+    Atomically replaces dst with a clone (reflink or copy) of src.
+    """
+    tmp_path = f"{dst}.clone_tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    __clone_file(src, tmp_path)
+    os.replace(tmp_path, dst)
+    directory_index.refresh_after_replace(dst)
+
+
+def __clone_file(src: str, dst: str) -> str:
+    device = os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+    if __try_reflink(src, dst, device):
+        return dst
+    return shutil.copy2(src, dst)
+
+
+def __try_reflink(src: str, dst: str, device: int) -> bool:
+    if fcntl is None or device in __reflink_unsupported_devices:
+        return False
+    try:
+        with open(src, 'rb') as src_fp, open(dst, 'wb') as dst_fp:
+            fcntl.ioctl(dst_fp.fileno(), __FICLONE, src_fp.fileno())
+    except OSError:
+        __reflink_unsupported_devices.add(device)
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
@@ -3,6 +3,16 @@ SIMULATION_DIR = "simulation"
 
 METADATA_FILENAME = 'metadata.json'
 MODFLOW_OUTPUT_JSON = "results.json"
+MODFLOW_OUTPUT_NPY = "results.npy"
+MODFLOW_OUTPUT_NPZ = "results.npz"
+FEEDBACK_LOOP_OUTPUT_JSON = "results_all_steps.json"
+FEEDBACK_LOOP_OUTPUT_NPY = "results_all_steps.npy"
+FEEDBACK_LOOP_OUTPUT_NPZ = "results_all_steps.npz"
+RESULTS_STORE_DIR = "results_store"
+SNAPSHOTS_DIR = "snapshots"
+SHAPE_INDEX_FILENAME = "shape_index"
+HYDRUS_STEP_CACHE_DIR = "hydrus_step_cache"
+WEATHER_CACHE_DIR = "weather_cache"
 
 
 def get_feedback_loop_hydrus_name(hydrus_id: str, shape_id: str) -> str:
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+from typing import Dict
+
+from . import directory_index
+
+MANIFEST_FILENAME = "manifest.json"
+OBJECTS_DIR = "objects"
+STAT_CACHE_FILENAME = "stat_cache.json"
+
+__HASH_CHUNK_SIZE = 1024 * 1024
+__READ_ONLY_MODE = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+def snapshot_step(snapshots_dir: str, step_dir: str, trees: Dict[str, str]) -> Dict[str, str]:
+    """
+    Snapshots directory trees into a simulation step directory. Files are deduplicated by content hash - each distinct
+    file is stored once in the object store and the step directory only links to the objects (files can be read
+    as usual), step content is described by a manifest. Files unchanged since the previous snapshot (same inode,
+    size and mtime) are not even hashed again.
+
+    Objects are shared by the steps, so step directories are read-only - objects are stored without write
+    permissions, step models are loaded without writing anything (e.g. Modflow check reports) and files copied
+    out of a step do not keep its permissions (shutil.copyfile).
+
+    @param snapshots_dir: Directory of the object store
+    @param step_dir: Directory of the simulation step (sim_step_<N>)
+    @param trees: Name of the tree inside the step directory -> source directory
+    @return: Manifest - path relative to the step directory -> content hash
+    """
+
+    stat_cache = __read_stat_cache(snapshots_dir)
+    new_stat_cache = {}
+    manifest = {}
+
+    for tree_name, src_dir in trees.items():
+        for root, _, files in os.walk(src_dir):
+            rel_root = os.path.relpath(root, src_dir)
+            os.makedirs(os.path.normpath(os.path.join(step_dir, tree_name, rel_root)), exist_ok=True)
+            for file in files:
+                src_path = os.path.join(root, file)
+                rel_path = os.path.normpath(os.path.join(tree_name, rel_root, file))
+
+                stat_key = __get_stat_key(src_path)
+                digest = stat_cache.get(stat_key) or __hash_file(src_path)
+                new_stat_cache[stat_key] = digest
+
+                object_path = __store_object(snapshots_dir, src_path, digest)
+                __link_or_copy(object_path, os.path.join(step_dir, rel_path))
+                manifest[rel_path.replace(os.sep, '/')] = digest
+
+    with open(os.path.join(step_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as fp:
+        json.dump(manifest, fp, indent=2)
+    __write_stat_cache(snapshots_dir, new_stat_cache)
+    directory_index.invalidate_tree(step_dir)
+    return manifest
+
+
+def read_manifest(step_dir: str) -> Dict[str, str]:
+    with open(os.path.join(step_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def get_object_path(snapshots_dir: str, digest: str) -> str:
+    return os.path.join(snapshots_dir, OBJECTS_DIR, digest[:2], digest)
+
+
+def __store_object(snapshots_dir: str, src_path: str, digest: str) -> str:
+    object_path = get_object_path(snapshots_dir, digest)
+    if not os.path.isfile(object_path):
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        # unique temporary file - the same object may be stored concurrently
+        tmp_fd, tmp_object_path = tempfile.mkstemp(dir=os.path.dirname(object_path), suffix=".tmp")
+        os.close(tmp_fd)
+        try:
+            shutil.copy2(src_path, tmp_object_path)
+            os.chmod(tmp_object_path, __READ_ONLY_MODE)
+            os.replace(tmp_object_path, object_path)
+        except BaseException:
+            if os.path.exists(tmp_object_path):
+                os.remove(tmp_object_path)
+            raise
+    return object_path
+
+
+def __link_or_copy(object_path: str, dst_path: str) -> None:
+    try:
+        os.link(object_path, dst_path)
+    except OSError:
+        shutil.copy2(object_path, dst_path)
+
+
+def __hash_file(file_path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(__HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def __get_stat_key(file_path: str) -> str:
+    stat = os.stat(file_path)
+    return f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def __read_stat_cache(snapshots_dir: str) -> Dict[str, str]:
+    stat_cache_path = os.path.join(snapshots_dir, STAT_CACHE_FILENAME)
+    if not os.path.isfile(stat_cache_path):
+        return {}
+    with open(stat_cache_path, 'r', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def __write_stat_cache(snapshots_dir: str, stat_cache: Dict[str, str]) -> None:
+    os.makedirs(snapshots_dir, exist_ok=True)
+    with open(os.path.join(snapshots_dir, STAT_CACHE_FILENAME), 'w', encoding='utf-8') as fp:
+        json.dump(stat_cache, fp)
@@ -1 +1,5 @@
 ALLOWED_UPLOAD_TYPES = ["ZIP"]
+
+# Limits of uploaded model archives (checked while extracting)
+MAX_UPLOAD_EXTRACTED_BYTES = 2 * 1024 ** 3
+MAX_UPLOAD_MEMBER_COUNT = 10_000
@@ -15,3 +15,7 @@ class ModflowCommonError(HTTPException):
     code = 400
     description = "Modflow model validation failed!"
 
+
+class UploadLimitExceededError(HTTPException):
+    code = 413
+    description = "Uploaded model archive exceeds the size limits!"
@@ -1,12 +1,12 @@
 from dataclasses import dataclass
-from typing import Optional, List, Dict
+from typing import Optional, Dict, Sequence
 
 import numpy as np
 
 
 @dataclass
 class ModflowExtraData:
-    rch_shapes: List[np.ndarray]
+    rch_shapes: Sequence[np.ndarray]
     start_date: Optional[str]
 
 
@@ -0,0 +1,195 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import numpy as np
+from flopy.utils import FormattedHeadFile
+
+from ..modflow import modflow_model_cache
+
+# Format of head files opened by path only
+FORMATTED_HEAD_EXTENSION = ".fhd"
+
+
+class HeadReader(ABC):
+    """
+    Common interface of Modflow head output readers. Semantics of get_data follow flopy's LayerFile:
+    idx is a record index, by default the last saved time is returned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @abstractmethod
+    def get_times(self) -> List[float]:
+        ...
+
+    @abstractmethod
+    def get_data(self, idx: Optional[int] = None, layer: Optional[int] = None) -> np.ndarray:
+        """
+        @param idx: Index of the record whose time should be read, None - last saved time
+        @param layer: Zero-based layer to read, None - all layers
+        @return: (layers, rows, cols) array or (rows, cols) array if layer is given
+        """
+        ...
+
+    @abstractmethod
+    def close(self) -> None:
+        ...
+
+    def __enter__(self) -> 'HeadReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class BinaryHeadReader(HeadReader):
+    """
+    Reader of binary (unformatted) Modflow head files. File is memory-mapped, only record headers
+    are scanned on opening - data is read only for the requested time and layer. A partial record at the end
+    of the file (output of an interrupted or still running simulation) is ignored.
+    """
+
+    def __init__(self, path: str, precision: Optional[str] = None):
+        super().__init__(path)
+        self._buffer = np.memmap(path, mode='r', dtype=np.uint8)
+        self.precision = precision or BinaryHeadReader._detect_precision(self._buffer)
+        self._real_dtype = np.dtype(np.float32 if self.precision == "single" else np.float64)
+        self._header_dtype = np.dtype([("kstp", "<i4"), ("kper", "<i4"),
+                                       ("pertim", self._real_dtype), ("totim", self._real_dtype),
+                                       ("text", "S16"),
+                                       ("ncol", "<i4"), ("nrow", "<i4"), ("ilay", "<i4")])
+        self._headers, self._data_offsets = self._scan_records()
+
+    def get_times(self) -> List[float]:
+        return sorted(set(self._headers["totim"].tolist()))
+
+    def get_data(self, idx: Optional[int] = None, layer: Optional[int] = None) -> np.ndarray:
+        totim = self._headers["totim"][idx] if idx is not None else max(self._headers["totim"])
+        record_ids = np.flatnonzero(self._headers["totim"] == totim)
+
+        if layer is not None:
+            record_id = next((rec for rec in record_ids if self._headers["ilay"][rec] == layer + 1), None)
+            if record_id is None:
+                raise IndexError(f"Layer {layer} not found for time {totim} in {self.path}")
+            return np.array(self._read_record(record_id))
+
+        nlay = int(self._headers["ilay"][record_ids].max())
+        nrow, ncol = int(self._headers["nrow"][record_ids[0]]), int(self._headers["ncol"][record_ids[0]])
+        data = np.zeros((nlay, nrow, ncol), dtype=self._real_dtype)
+        for record_id in record_ids:
+            data[self._headers["ilay"][record_id] - 1] = self._read_record(record_id)
+        return data
+
+    def close(self) -> None:
+        self._buffer = None
+
+    def _read_record(self, record_id: int) -> np.ndarray:
+        nrow, ncol = int(self._headers["nrow"][record_id]), int(self._headers["ncol"][record_id])
+        return np.frombuffer(self._buffer, dtype=self._real_dtype, count=nrow * ncol,
+                             offset=int(self._data_offsets[record_id])).reshape(nrow, ncol)
+
+    def _scan_records(self):
+        headers = []
+        data_offsets = []
+        offset = 0
+        file_size = len(self._buffer)
+        while offset + self._header_dtype.itemsize <= file_size:
+            header = np.frombuffer(self._buffer, dtype=self._header_dtype, count=1, offset=offset)[0]
+            data_offset = offset + self._header_dtype.itemsize
+            record_end = data_offset + int(header["ncol"]) * int(header["nrow"]) * self._real_dtype.itemsize
+            if record_end > file_size:
+                break
+            headers.append(header)
+            data_offsets.append(data_offset)
+            offset = record_end
+        if not headers:
+            raise RuntimeError(f"No complete record in binary head file: {self.path}")
+        if offset != file_size:
+            logging.warning(f"Ignoring partial record at the end of binary head file: {self.path} "
+                            f"({file_size - offset} bytes)")
+        return np.array(headers, dtype=self._header_dtype), np.array(data_offsets, dtype=np.int64)
+
+    @staticmethod
+    def _detect_precision(buffer: np.ndarray) -> str:
+        # TEXT label follows KSTP, KPER, PERTIM and TOTIM - its position depends on the size of reals
+        for precision, text_offset in (("single", 16), ("double", 24)):
+            text = bytes(buffer[text_offset:text_offset + 16])
+            if text.strip() and all(32 <= char < 127 for char in text) and text.strip().replace(b' ', b'').isalpha():
+                return precision
+        raise RuntimeError("Could not detect precision of the binary head file!")
+
+
+class FormattedHeadReader(HeadReader):
+
+    def __init__(self, path: str, precision: str = "single"):
+        super().__init__(path)
+        self._head_file = FormattedHeadFile(path, precision=precision)
+
+    def get_times(self) -> List[float]:
+        return self._head_file.get_times()
+
+    def get_data(self, idx: Optional[int] = None, layer: Optional[int] = None) -> np.ndarray:
+        data = self._head_file.get_data(idx=idx)
+        return data[layer] if layer is not None else data
+
+    def close(self) -> None:
+        self._head_file.close()
+
+
+def find_head_output(model_dir: str) -> Optional[Tuple[str, bool]]:
+    """
+    Finds head output of a model as set in its OC package - file of the head save unit (from the name file),
+    formatted if the package sets the head save format, binary otherwise.
+
+    @return: Path to the head file and whether it is formatted, None if model saves no heads (or did not run yet)
+    """
+
+    try:
+        # step directories are read-only - no check report is written
+        model = modflow_model_cache.load_model(model_dir, load_only=["oc"], check=False)
+    except KeyError:
+        # no OC package in the name file - Modflow saves no heads
+        return None
+    oc_package = model.get_package("OC")
+    if oc_package is None or not oc_package.iuhead:
+        return None
+    unit_files = dict(zip(model.external_units, model.external_fnames))
+    unit_files.update(zip(model.output_units, model.output_fnames))
+    if oc_package.iuhead not in unit_files:
+        raise RuntimeError(f"Head save unit {oc_package.iuhead} of the OC package is missing in the name file "
+                           f"of Modflow model: {model_dir}")
+    head_file_path = os.path.join(model_dir, unit_files[oc_package.iuhead])
+    if not os.path.isfile(head_file_path):
+        return None
+    return head_file_path, oc_package.chedfm is not None
+
+
+def find_head_file(model_dir: str) -> Optional[str]:
+    """
+    @return: Path to the head file of a model (see find_head_output) or None if model has no head output
+    """
+
+    head_output = find_head_output(model_dir)
+    return head_output[0] if head_output else None
+
+
+def open_head_file(head_file_path: str, formatted: Optional[bool] = None) -> HeadReader:
+    """
+    @param formatted: Format of the head file, None - formatted only for FORMATTED_HEAD_EXTENSION files
+    """
+
+    if formatted is None:
+        formatted = os.path.splitext(head_file_path)[1].lower() == FORMATTED_HEAD_EXTENSION
+    if formatted:
+        return FormattedHeadReader(head_file_path)
+    return BinaryHeadReader(head_file_path)
+
+
+def open_model_heads(model_dir: str) -> HeadReader:
+    head_output = find_head_output(model_dir)
+    if head_output is None:
+        raise FileNotFoundError(f"No head output found in Modflow model: {model_dir}")
+    return open_head_file(*head_output)
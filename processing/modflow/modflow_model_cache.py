@@ -0,0 +1,104 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import flopy
+from flopy.modflow import Modflow
+
+from ..modflow import modflow_utils
+
+CHECK_REPORT_EXTENSION = ".chk"
+
+
+@dataclass
+class _CachedModel:
+    model: Modflow
+    packages: Optional[FrozenSet[str]]  # None - whole model loaded
+    files_signature: Tuple
+
+
+@dataclass
+class ModflowModelCache:
+    """
+    Keeps parsed Modflow models for the lifetime of the process. Entries are keyed by model directory
+    and validated against mtimes of files in that directory, so a package rewritten with write_file
+    is parsed again on the next access.
+
+    Cached models are shared between callers and must be treated as read-only. Callers modifying packages
+    load the model with for_update=True - the model is then removed from the cache and owned by the caller.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    _entries: Dict[str, _CachedModel] = field(default_factory=dict)
+
+    def load(self, model_dir: str, load_only: Optional[List[str]] = None, for_update: bool = False,
+             check: bool = True) -> Modflow:
+        """
+        @param model_dir: Path to the Modflow model directory
+        @param load_only: Packages to load (as in Modflow.load), None loads the whole model
+        @param for_update: The model is going to be modified - it is not kept in (or returned from) the cache anymore
+        @param check: Check the model when it is parsed (as in Modflow.load) - writes a check report to model_dir
+        @return: Parsed model - read-only and shared between callers unless loaded for update
+        """
+
+        key = os.path.abspath(model_dir)
+        requested = frozenset(pkg.lower() for pkg in load_only) if load_only is not None else None
+        files_signature = ModflowModelCache._get_files_signature(model_dir)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.files_signature == files_signature:
+            if ModflowModelCache._covers(entry.packages, requested):
+                self.hits += 1
+                if for_update:
+                    del self._entries[key]
+                return entry.model
+            # Packages are loaded lazily - extend already cached set with the requested ones
+            requested = entry.packages | requested if requested is not None else None
+
+        self.misses += 1
+        model = flopy.modflow.Modflow.load(modflow_utils.scan_for_modflow_file(model_dir, ext=".nam"),
+                                           model_ws=model_dir,
+                                           load_only=sorted(requested) if requested is not None else None,
+                                           forgive=True, check=check)
+        if for_update:
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = _CachedModel(model=model, packages=requested, files_signature=files_signature)
+        return model
+
+    def invalidate(self, model_dir: str) -> None:
+        self._entries.pop(os.path.abspath(model_dir), None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "cached_models": len(self._entries)}
+
+    @staticmethod
+    def _covers(cached: Optional[FrozenSet[str]], requested: Optional[FrozenSet[str]]) -> bool:
+        if cached is None:
+            return True
+        return requested is not None and requested <= cached
+
+    @staticmethod
+    def _get_files_signature(model_dir: str) -> Tuple:
+        # check reports are rewritten by each Modflow.load - they do not invalidate the parsed model
+        with os.scandir(model_dir) as entries:
+            return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                                for entry in entries
+                                if entry.is_file() and not entry.name.endswith(CHECK_REPORT_EXTENSION)))
+
+
+MODEL_CACHE = ModflowModelCache()
+
+
+def load_model(model_dir: str, load_only: Optional[List[str]] = None, for_update: bool = False,
+               check: bool = True) -> Modflow:
+    return MODEL_CACHE.load(model_dir, load_only, for_update, check)
+
+
+def invalidate(model_dir: str) -> None:
+    MODEL_CACHE.invalidate(model_dir)
+
+
+def get_stats() -> Dict[str, int]:
+    return MODEL_CACHE.get_stats()
@@ -1,16 +1,13 @@
 import os
 import shutil
-from typing import Optional
+from typing import Optional, List, Dict
 
-import flopy
-import numpy as np
-from flopy.modflow import Modflow, ModflowBas
-from flopy.utils import FormattedHeadFile
+from flopy.modflow import ModflowBas
 
-from . import modflow_package_manager
-from ..local_fs_configuration import local_paths
+from . import modflow_package_manager, modflow_model_cache, modflow_head_reader
+from ..local_fs_configuration import local_paths, model_cloning, directory_index
 from ..local_fs_configuration.feedback_loop_file_management import find_previous_simulation_step_dir
-from ..modflow import modflow_utils
+from ..shape_index import get_shape_index
 
 
 def prepare_model_for_next_iteration(project_id: str, modflow_id: str) -> None:
@@ -26,60 +23,57 @@ def get_avg_water_depth_for_shape(project_id: str,
                                   modflow_id: str,
                                   shape_id: str,
                                   use_modflow_results: bool) -> float:
-    model_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
-    nam_file_name = modflow_utils.scan_for_modflow_file(model_dir, ext=".nam")
-
-    packages = ["dis", "bas6"]
-    if use_modflow_results:
-        fhd_file_name = modflow_utils.scan_for_modflow_file(model_dir, ext=".fhd")
-        fhd_data = FormattedHeadFile(os.path.join(model_dir, fhd_file_name))
-    else:
-        fhd_data = None
-
-    model = Modflow.load(nam_file_name, model_ws=model_dir, load_only=packages, forgive=True)
-    mask = np.load(local_paths.get_shape_path(project_id, shape_id))
-    avg_terrain_lvl = __get_avg_terrain_level(model, shape_mask=mask)
+    return get_avg_water_depths_for_shapes(project_id, modflow_id, [shape_id], use_modflow_results)[shape_id]
 
-    inbound = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas)).ibound[0].array
-    avg_water_lvl = __get_avg_water_level(model, shape_mask=mask*inbound, fhd_data=fhd_data)
 
-    if use_modflow_results:
-        fhd_data.close()
-    return avg_terrain_lvl - avg_water_lvl
+def get_avg_water_depths_for_shapes(project_id: str,
+                                    modflow_id: str,
+                                    shape_ids: List[str],
+                                    use_modflow_results: bool) -> Dict[str, float]:
+    """
+    Loads the model and heads once and computes the average water depth for all shapes
+    with a single pass over the shape index.
 
+    @return: Shape id -> average water depth (in Modflow units)
+    """
 
-def __get_avg_terrain_level(model: Modflow, shape_mask: np.ndarray) -> float:
-    return float(np.average(model.modelgrid.top[shape_mask == 1]))
+    if not shape_ids:
+        return {}
 
+    model_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
+    model = modflow_model_cache.load_model(model_dir, load_only=["dis", "bas6"])
+    bas_package = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas))
 
-def __get_avg_water_level(model: Modflow, shape_mask: np.ndarray,
-                          fhd_data: Optional[FormattedHeadFile] = None) -> float:
-    if fhd_data:
-        water_lvl_array = fhd_data.get_data()[0]
+    if use_modflow_results:
+        with modflow_head_reader.open_model_heads(model_dir) as head_data:
+            water_lvl_array = head_data.get_data(layer=0)
     else:
-        bas_package = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas))
         water_lvl_array = bas_package.strt[0].array
-    return float(np.average(water_lvl_array[shape_mask == 1]))
+
+    shape_index = get_shape_index(project_id)
+    inbound = bas_package.ibound[0].array
+
+    avg_terrain_lvls = shape_index.zone_means_by_id(model.modelgrid.top)
+    avg_water_lvls = shape_index.zone_means_by_id(water_lvl_array, cell_filter=inbound == 1)
+    return {shape_id: avg_terrain_lvls[shape_id] - avg_water_lvls[shape_id] for shape_id in shape_ids}
 
 
 def __create_temporary_model(ref_modflow_dir: str, prev_modflow_dir: Optional[str], new_modflow_dir: str, step: int):
     shutil.rmtree(new_modflow_dir, ignore_errors=True)
-    shutil.copytree(ref_modflow_dir, new_modflow_dir)
-    dst_model = flopy.modflow.Modflow.load(modflow_utils.scan_for_modflow_file(new_modflow_dir, ext=".nam"),
-                                           model_ws=new_modflow_dir,
-                                           forgive=True)
+    model_cloning.clone_tree(ref_modflow_dir, new_modflow_dir)
+    dst_model = modflow_model_cache.load_model(new_modflow_dir, for_update=True)
 
     # Initial conditions from previous iteration
     if prev_modflow_dir is not None:
-        fhd_filename = modflow_utils.scan_for_modflow_file(prev_modflow_dir, ext=".fhd")
-        prev_model_fhd_path = os.path.join(prev_modflow_dir, fhd_filename)
-        shutil.copy(prev_model_fhd_path, os.path.join(new_modflow_dir, fhd_filename))
+        with modflow_head_reader.open_model_heads(prev_modflow_dir) as prev_model_heads:
+            shutil.copyfile(prev_model_heads.path,
+                            os.path.join(new_modflow_dir, os.path.basename(prev_model_heads.path)))
+            directory_index.invalidate(new_modflow_dir)
 
-        prev_model_fhd = FormattedHeadFile(prev_model_fhd_path)
-        bas_package = next(pkg for pkg in dst_model.packagelist if isinstance(pkg, ModflowBas))
-        bas_package.strt = prev_model_fhd.get_data()
-        bas_package.write_file()
-        prev_model_fhd.close()
+            bas_package = next(pkg for pkg in dst_model.packagelist if isinstance(pkg, ModflowBas))
+            bas_package.strt = prev_model_heads.get_data()
+            bas_package.write_file()
 
     # Crop packages to one timestep
     modflow_package_manager.create_packages_for_step(dst_model, step)
+    modflow_model_cache.invalidate(new_modflow_dir)
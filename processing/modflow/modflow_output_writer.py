@@ -0,0 +1,73 @@
+import json
+import textwrap
+from enum import auto
+from typing import Iterator, Optional
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import numpy as np
+from strenum import StrEnum
+
+
+class OutputFormat(StrEnum):
+    json = auto()  # streamed JSON, one stress period at a time
+    npy = auto()  # single (periods, layers, rows, cols) array written through a memory map
+    npz = auto()  # compressed archive with one array per stress period
+
+
+def write_output(periods: Iterator[np.ndarray], period_count: int, output_path: str,
+                 output_format: OutputFormat = OutputFormat.json,
+                 float_precision: Optional[int] = None) -> None:
+    """
+    Writes Modflow results period by period - at most one period is kept in memory.
+
+    @param periods: Iterator over arrays of consecutive stress periods (all of the same shape)
+    @param period_count: Number of periods yielded by the iterator
+    @param output_path: Path of the output file
+    @param output_format: Format of the output file
+    @param float_precision: Number of decimals to round values to (None - no rounding)
+    """
+
+    if float_precision is not None:
+        periods = (np.round(np.asarray(period, dtype=np.float64), float_precision) for period in periods)
+
+    if output_format == OutputFormat.json:
+        __write_json(periods, output_path)
+    elif output_format == OutputFormat.npy:
+        __write_npy(periods, period_count, output_path)
+    elif output_format == OutputFormat.npz:
+        __write_npz(periods, output_path)
+    else:
+        raise RuntimeError(f"Unknown output format: {output_format}")
+
+
+def __write_json(periods: Iterator[np.ndarray], output_path: str) -> None:
+    # Same layout as json.dump(all_periods, indent=2) without materializing all periods
+    with open(output_path, 'w') as handle:
+        first_period = True
+        for period in periods:
+            handle.write("[\n" if first_period else ",\n")
+            handle.write(textwrap.indent(json.dumps(period.tolist(), indent=2), "  "))
+            first_period = False
+        handle.write("[]" if first_period else "\n]")
+
+
+def __write_npy(periods: Iterator[np.ndarray], period_count: int, output_path: str) -> None:
+    output = None
+    for idx, period in enumerate(periods):
+        if output is None:
+            output = np.lib.format.open_memmap(output_path, mode="w+", dtype=period.dtype,
+                                               shape=(period_count, *period.shape))
+        output[idx] = period
+    if output is None:
+        np.save(output_path, np.empty(0))
+    else:
+        output.flush()
+        del output
+
+
+def __write_npz(periods: Iterator[np.ndarray], output_path: str) -> None:
+    # Loadable with np.load - each period is stored as "period_<idx>"
+    with ZipFile(output_path, 'w', compression=ZIP_DEFLATED, allowZip64=True) as archive:
+        for idx, period in enumerate(periods):
+            with archive.open(f"period_{idx}.npy", 'w', force_zip64=True) as member:
+                np.lib.format.write_array(member, np.asarray(period))
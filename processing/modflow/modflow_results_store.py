@@ -0,0 +1,164 @@
+import glob
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Iterator, Optional, Tuple
+
+import numpy as np
+from flopy.modflow import ModflowBas
+
+from . import modflow_model_cache, modflow_head_reader
+from ..local_fs_configuration import local_paths
+from ..local_fs_configuration.feedback_loop_file_management import find_previous_simulation_step_dir
+
+HEADS_FILENAME = "heads.bin"
+INDEX_FILENAME = "index.json"
+
+
+@dataclass
+class ModflowResultsStore:
+    """
+    Append-only store of results of feedback loop steps. Heads of all steps are appended to a single binary file,
+    index file keeps offset, shape and dtype of each step's heads along with average water level in each zone.
+    """
+
+    store_dir: str
+
+    def append_step(self, step: int, heads: np.ndarray, zone_averages: Dict[str, float],
+                    source_signature: Optional[List[int]] = None) -> None:
+        """
+        @param step: Number of the simulation step (sim_step_<step>)
+        @param heads: (periods, layers, rows, cols) heads of the step
+        @param zone_averages: Shape file name -> average water level in the shape (as in the water level plot)
+        @param source_signature: Size and mtime of the head file the heads were read from
+        """
+
+        index = self.read_index()
+        if any(entry["step"] == step for entry in index):
+            return  # step already stored
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        heads = np.ascontiguousarray(heads)
+        with open(os.path.join(self.store_dir, HEADS_FILENAME), 'ab') as fp:
+            offset = fp.tell()
+            fp.write(heads.tobytes())
+
+        index.append({
+            "step": step,
+            "offset": offset,
+            "shape": list(heads.shape),
+            "dtype": heads.dtype.str,
+            "zone_averages": zone_averages,
+            "source_signature": source_signature
+        })
+        self.__write_index(index)
+
+    def read_index(self) -> List[Dict]:
+        index_path = os.path.join(self.store_dir, INDEX_FILENAME)
+        if not os.path.isfile(index_path):
+            return []
+        with open(index_path, 'r', encoding='utf-8') as fp:
+            return sorted(json.load(fp), key=lambda entry: entry["step"])
+
+    def get_steps(self) -> List[int]:
+        return [entry["step"] for entry in self.read_index()]
+
+    def read_heads(self, step: int) -> np.ndarray:
+        entry = next(entry for entry in self.read_index() if entry["step"] == step)
+        return self.__map_heads(entry)
+
+    def iterate_periods(self) -> Iterator[np.ndarray]:
+        """
+        @return: Iterator over heads of consecutive stress periods of all stored steps
+        """
+        for entry in self.read_index():
+            yield from self.__map_heads(entry)
+
+    def get_period_count(self) -> int:
+        return sum(entry["shape"][0] for entry in self.read_index())
+
+    def read_zone_averages(self) -> Dict[int, Dict[str, float]]:
+        return {entry["step"]: entry["zone_averages"] for entry in self.read_index()}
+
+    def __map_heads(self, entry: Dict) -> np.ndarray:
+        return np.memmap(os.path.join(self.store_dir, HEADS_FILENAME), mode='r',
+                         dtype=np.dtype(entry["dtype"]), offset=entry["offset"], shape=tuple(entry["shape"]))
+
+    def __write_index(self, index: List[Dict]) -> None:
+        index_path = os.path.join(self.store_dir, INDEX_FILENAME)
+        tmp_index_path = f"{index_path}.tmp"
+        with open(tmp_index_path, 'w', encoding='utf-8') as fp:
+            json.dump(index, fp)
+        os.replace(tmp_index_path, index_path)
+
+
+def get_results_store(project_id: str) -> ModflowResultsStore:
+    return ModflowResultsStore(local_paths.get_results_store_dir(project_id))
+
+
+def append_simulation_step(project_id: str, modflow_id: str) -> None:
+    """
+    Appends results of the latest simulation step (sim_step_<N> directory) to the project results store.
+    """
+
+    step_dir = find_previous_simulation_step_dir(project_id)
+    if step_dir is None:
+        return
+    step = int(step_dir.split('_')[-1])
+    model_dir = os.path.join(step_dir, "modflow", modflow_id)
+
+    # step directories are read-only (see snapshot_store) - no check report is written
+    model = modflow_model_cache.load_model(model_dir, load_only=["dis", "bas6"], check=False)
+    with modflow_head_reader.open_model_heads(model_dir) as head_data:
+        heads = np.array([head_data.get_data(idx=stress_period) for stress_period in range(model.nper)])
+        last_heads = head_data.get_data()
+
+    inbound = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas)).ibound[0].array
+    zone_averages = {}
+    for np_shape_path in sorted(glob.glob(os.path.join(local_paths.get_shapes_dir(project_id, simulation_mode=True),
+                                                       "*"))):
+        shape_mask = np.load(np_shape_path)
+        zone_averages[os.path.basename(np_shape_path)] = float(np.average(inbound * shape_mask * last_heads))
+
+    # the step is a snapshot of the current simulation directory - its head file is the source of the heads
+    current_model_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
+    get_results_store(project_id).append_step(step, heads, zone_averages,
+                                              source_signature=__get_head_file_signature(current_model_dir))
+
+
+def get_feedback_loop_periods(project_id: str, modflow_id: str) -> Tuple[Iterator[np.ndarray], int]:
+    """
+    Heads of the whole feedback loop - stored steps followed by the last Modflow run of the simulation directory,
+    unless it was already stored (no run since the last step).
+
+    @return: Iterator over heads of consecutive stress periods and number of the periods
+    """
+
+    results_store = get_results_store(project_id)
+    index = results_store.read_index()
+    model_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
+    head_file_signature = __get_head_file_signature(model_dir)
+    last_run_stored = bool(index) and index[-1].get("source_signature") == head_file_signature
+
+    period_count = results_store.get_period_count()
+    if head_file_signature is not None and not last_run_stored:
+        last_run_period_count = modflow_model_cache.load_model(model_dir, load_only=["dis"]).nper
+        period_count += last_run_period_count
+        return __iterate_periods_with_last_run(results_store, model_dir, last_run_period_count), period_count
+    return results_store.iterate_periods(), period_count
+
+
+def __iterate_periods_with_last_run(results_store: ModflowResultsStore, model_dir: str,
+                                    period_count: int) -> Iterator[np.ndarray]:
+    yield from results_store.iterate_periods()
+    with modflow_head_reader.open_model_heads(model_dir) as head_data:
+        for stress_period in range(period_count):
+            yield head_data.get_data(idx=stress_period)
+
+
+def __get_head_file_signature(model_dir: str) -> Optional[List[int]]:
+    head_file_path = modflow_head_reader.find_head_file(model_dir) if os.path.isdir(model_dir) else None
+    if head_file_path is None:
+        return None
+    stat = os.stat(head_file_path)
+    return [stat.st_size, stat.st_mtime_ns]
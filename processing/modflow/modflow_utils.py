@@ -1,18 +1,19 @@
 import copy
 import os
-from collections import deque
-from typing import List, Tuple, Optional
-from zipfile import ZipFile
+from typing import List, Tuple, Optional, Sequence
 
 import flopy
 import numpy as np
 from flopy.modflow import ModflowBas
 
 from .modflow_step import ModflowStep, ModflowStepType
+from .. import upload_extraction
+from ..local_fs_configuration import directory_index
 from ..model_exceptions import ModflowMissingFileError, ModflowCommonError
-from . import modflow_extra_data
+from . import modflow_extra_data, rch_shape_labeling
 from .modflow_extra_data import ModflowExtraData
 from .modflow_metadata import ModflowMetadata
+from ..timing_utils import StageTimer
 from ..unit_manager import LengthUnit
 
 
@@ -31,43 +32,44 @@ def adapt_model_to_display(metadata: ModflowMetadata):
 def extract_metadata(modflow_archive, tmp_dir: os.PathLike) -> Tuple[ModflowMetadata, ModflowExtraData, np.ndarray]:
     extension = modflow_archive.filename.split('.')[-1]
     modflow_id = modflow_archive.filename.replace(f".{extension}", "")
-
-    modflow_path = os.path.join(tmp_dir, modflow_archive.filename)
-    modflow_archive.save(modflow_path)
-    with ZipFile(modflow_path, 'r') as archive:
-        archive.extractall(tmp_dir)
-    os.remove(modflow_path)
-    __validate_model(tmp_dir)
-
-    model = flopy.modflow.Modflow.load(scan_for_modflow_file(tmp_dir),
-                                       model_ws=tmp_dir,
-                                       load_only=["rch", "dis"],
-                                       forgive=True)
-
-    model_shape = (model.nrow, model.ncol)
-    model_steps = [ModflowStep(duration=int(duration), type=ModflowStepType.from_bool(is_steady_state))
-                   for is_steady_state, duration in zip(model.modeltime.steady_state, model.modeltime.perlen)]
-    model_metadata = ModflowMetadata(modflow_id,
-                                     rows=model_shape[0], cols=model_shape[1],
-                                     row_cells=model.dis.delc.array.tolist(),
-                                     col_cells=model.dis.delr.array.tolist(),
-                                     grid_unit=LengthUnit.map_from_alias(model.modelgrid.units),
-                                     steps_info=model_steps)
-    rch_shape_data, inactive_cells_data = get_shapes_from_rch(model_path=tmp_dir, model_shape=model_shape)
-    extra_data = ModflowExtraData(
-        **modflow_extra_data.extract_extra_from_model(model),
-        rch_shapes=rch_shape_data
-    )
+    timer = StageTimer(f"Modflow model upload ({modflow_id})")
+
+    with timer.stage("extraction"):
+        upload_extraction.extract_uploaded_archive(modflow_archive, tmp_dir)
+
+    # Model is parsed only once - metadata, shapes and inactive cells are read from the validated instance
+    with timer.stage("loading and validation"):
+        model = __load_and_validate_model(tmp_dir)
+
+    with timer.stage("metadata"):
+        model_shape = (model.nrow, model.ncol)
+        model_steps = [ModflowStep(duration=int(duration), type=ModflowStepType.from_bool(is_steady_state))
+                       for is_steady_state, duration in zip(model.modeltime.steady_state, model.modeltime.perlen)]
+        model_metadata = ModflowMetadata(modflow_id,
+                                         rows=model_shape[0], cols=model_shape[1],
+                                         row_cells=model.dis.delc.array.tolist(),
+                                         col_cells=model.dis.delr.array.tolist(),
+                                         grid_unit=LengthUnit.map_from_alias(model.modelgrid.units),
+                                         steps_info=model_steps)
+
+    with timer.stage("recharge shapes"):
+        rch_shape_data, inactive_cells_data = get_shapes_from_model(model)
+        extra_data = ModflowExtraData(
+            **modflow_extra_data.extract_extra_from_model(model),
+            rch_shapes=rch_shape_data
+        )
+
+    timer.log()
     return model_metadata, extra_data, inactive_cells_data
 
 
-def __validate_model(model_path: os.PathLike) -> None:
+def __load_and_validate_model(model_path: os.PathLike) -> flopy.modflow.Modflow:
     """
-    Validates modflow model - check if it contains .nam file (list of files), .rch file (recharge),
+    Loads and validates modflow model - check if it contains .nam file (list of files), .rch file (recharge),
     perform recharge check.
 
     @param model_path: Path to Modflow project main directory
-    @return: True if model is valid, False otherwise
+    @return: Loaded model (all packages)
     """
 
     nam_file_name = scan_for_modflow_file(model_path)
@@ -87,6 +89,7 @@ def __validate_model(model_path: os.PathLike) -> None:
         raise ModflowMissingFileError(description="Invalid Modflow model - validation detected missing files!")
     except KeyError:
         raise ModflowCommonError(description="Invalid Modflow model - validation detected an unspecified error!")
+    return m
 
 
 def scale_cells_size(row_cells: List[float],
@@ -111,13 +114,14 @@ def scale_cells_size(row_cells: List[float],
     return list(row_cells), list(col_cells), int(total_width), int(total_height)
 
 
-def get_shapes_from_rch(model_path: os.PathLike, model_shape: Tuple[int, int]) -> Tuple[List[np.ndarray], np.ndarray]:
+def get_shapes_from_rch(model_path: os.PathLike,
+                        model_shape: Tuple[int, int]) -> Tuple[Sequence[np.ndarray], np.ndarray]:
     """
     Defines shapes masks for uploaded Modflow model based on recharge
 
     @param model_path: Path of Modflow model
     @param model_shape: Tuple representing size of the Modflow project (rows, cols)
-    @return: List of shapes read from Modflow project
+    @return: Shapes read from Modflow project (masks created lazily from a label raster) and inactive cells mask
     """
 
     nam_file_name = scan_for_modflow_file(model_path)
@@ -125,72 +129,27 @@ def get_shapes_from_rch(model_path: os.PathLike, model_shape: Tuple[int, int]) -
                                                model_ws=model_path,
                                                load_only=["rch", "bas6"],
                                                forgive=True)
+    return get_shapes_from_model(modflow_model)
+
+
+def get_shapes_from_model(modflow_model: flopy.modflow.Modflow) -> Tuple[Sequence[np.ndarray], np.ndarray]:
+    """
+    Defines shapes masks based on recharge of an already loaded Modflow model (requires rch and bas6 packages)
+
+    @param modflow_model: Loaded Modflow model
+    @return: Shapes read from Modflow project (masks created lazily from a label raster) and inactive cells mask
+    """
 
     stress_period = 0
     layer = 0
 
-    recharge_masks = []
-    is_checked_array = np.full(model_shape, False)
     recharge_array = modflow_model.rch.rech.array[stress_period][layer]
-    modflow_rows, modflow_cols = model_shape
-
-    for row in range(modflow_rows):
-        for col in range(modflow_cols):
-            if not is_checked_array[row][col]:
-                recharge_masks.append(np.zeros(model_shape))
-                __fill_mask_iterative(mask=recharge_masks[-1], recharge_array=recharge_array,
-                                      is_checked_array=is_checked_array,
-                                      project_shape=model_shape,
-                                      row=row, col=col,
-                                      value=recharge_array[row][col])
+    recharge_masks = rch_shape_labeling.LabeledShapeMasks(rch_shape_labeling.label_recharge_zones(recharge_array))
 
     ibound = next(pkg for pkg in modflow_model.packagelist if isinstance(pkg, ModflowBas)).ibound[0].array
     inactive_cells = np.where(ibound == 0, 1, 0)
     return recharge_masks, inactive_cells
 
 
-def __fill_mask_iterative(mask: np.ndarray,
-                          recharge_array: np.ndarray,
-                          is_checked_array: np.ndarray,
-                          project_shape: Tuple[int, int],
-                          row: int,
-                          col: int,
-                          value: float):
-    """
-    Fill given mask with 1's according to recharge array (using DFS)
-
-    @param mask: Binary mask of current shape - initially filled with 0's
-    @param recharge_array: 2d array filled with modflow model recharge values
-    @param is_checked_array: Control array - 'True' means that given cell was already used in one of the masks
-    @param project_shape: Tuple representing shape of the Modflow project (rows, cols)
-    @param row: Current column index
-    @param col: Current row index
-    @param value: Recharge value of current mask
-    @return: None (result inside variable @mask)
-    """
-    modflow_rows, modflow_cols = project_shape
-
-    stack = deque()
-    stack.append((row, col))
-
-    while stack:
-        cur_row, cur_col = stack.pop()
-        # return condition - out of bounds or given cell was already used
-        if cur_row < 0 or cur_row >= modflow_rows or cur_col < 0 or cur_col >= modflow_cols or \
-                is_checked_array[cur_row][cur_col]:
-            continue
-
-        if recharge_array[cur_row][cur_col] == value:
-            is_checked_array[cur_row][cur_col] = True
-            mask[cur_row][cur_col] = 1
-            stack.append((cur_row - 1, cur_col))
-            stack.append((cur_row + 1, cur_col))
-            stack.append((cur_row, cur_col - 1))
-            stack.append((cur_row, cur_col + 1))
-
-
 def scan_for_modflow_file(model_path: str, ext: str = ".nam") -> Optional[str]:
-    for file in os.listdir(model_path):
-        if file.endswith(ext):
-            return file
-    return None
+    return directory_index.find_file_with_extension(model_path, ext)
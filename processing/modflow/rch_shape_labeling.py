@@ -0,0 +1,63 @@
+from typing import Sequence, Union, List
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+class LabeledShapeMasks(Sequence):
+    """
+    Shapes stored as a single label raster - masks (same format as the ones saved by frontend: float, 1 inside
+    the shape, 0 outside) are created only when accessed.
+    """
+
+    def __init__(self, labels: np.ndarray):
+        self.labels = labels
+        self.shape_count = int(labels.max()) + 1 if labels.size else 0
+
+    def __len__(self) -> int:
+        return self.shape_count
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[np.ndarray, List[np.ndarray]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Shape index out of range: {idx}")
+        return (self.labels == idx).astype(np.float64)
+
+
+def label_recharge_zones(recharge_array: np.ndarray) -> np.ndarray:
+    """
+    Splits recharge array into 4-connected components of cells with equal recharge value.
+
+    @param recharge_array: 2d array filled with modflow model recharge values
+    @return: int32 label raster - labels are numbered in order of the first cell of each component (row-major scan)
+    """
+
+    rows, cols = recharge_array.shape
+    cell_count = rows * cols
+    if cell_count == 0:
+        return np.zeros((rows, cols), dtype=np.int32)
+
+    # Quantize recharge values - equal values get equal codes
+    _, codes = np.unique(recharge_array.ravel(), return_inverse=True)
+    codes = codes.reshape(rows, cols)
+    cell_ids = np.arange(cell_count).reshape(rows, cols)
+
+    # Edges between neighbouring cells of the same value
+    same_as_right = codes[:, :-1] == codes[:, 1:]
+    same_as_below = codes[:-1, :] == codes[1:, :]
+    edge_src = np.concatenate([cell_ids[:, :-1][same_as_right], cell_ids[:-1, :][same_as_below]])
+    edge_dst = np.concatenate([cell_ids[:, 1:][same_as_right], cell_ids[1:, :][same_as_below]])
+    graph = coo_matrix((np.ones(len(edge_src), dtype=np.int8), (edge_src, edge_dst)), shape=(cell_count, cell_count))
+
+    _, component_ids = connected_components(graph, directed=False)
+
+    # Renumber components in order of their first cell
+    _, first_cells = np.unique(component_ids, return_index=True)
+    component_order = np.argsort(first_cells)
+    component_rank = np.empty_like(component_order)
+    component_rank[component_order] = np.arange(len(component_order))
+    return component_rank[component_ids].reshape(rows, cols).astype(np.int32)
@@ -1,8 +1,11 @@
 import os
-from typing import List
+from typing import List, Iterator, TextIO
 
 import numpy as np
 
+# List of valid values for LOCAT
+__LOCATS = ("CONSTANT", "INTERNAL", "EXTERNAL")
+
 
 # Credits to FloPy
 def read_zone_file(fname) -> List[np.ndarray]:
@@ -19,125 +22,100 @@ def read_zone_file(fname) -> List[np.ndarray]:
 
     """
     with open(fname, "r") as f:
-        lines = f.readlines()
-
-    # Initialize layer
-    lay = 0
-
-    # Initialize data counter
-    totlen = 0
-    i = 0
-
-    # First line contains array dimensions
-    dimstring = __skip_comments(lines.pop(0).strip().split())
-    nlay, nrow, ncol = [int(v) for v in dimstring]
-    zones = np.zeros((nlay, nrow, ncol), dtype=np.int32)
-
-    # The number of values to read before placing
-    # them into the zone array
-    datalen = nrow * ncol
-    totaldatalen = nlay * nrow * ncol
-
-    # List of valid values for LOCAT
-    locats = ["CONSTANT", "INTERNAL", "EXTERNAL"]
-
-    # ITERATE OVER THE ROWS
-    for line in lines:
-        if totlen == totaldatalen:
-            break
-
-        rowitems = __skip_comments(line.strip().split())
-
-        # Skip blank lines
-        if len(rowitems) == 0:
-            continue
-
-        # HEADER
-        if rowitems[0].upper() in locats:
-            vals = []
+        lines = __iterate_lines(f)
+
+        # First line contains array dimensions
+        nlay, nrow, ncol = [int(v) for v in next(lines).split()[:3]]
+        zones = np.zeros((nlay, nrow, ncol), dtype=np.int32)
+
+        # The number of values to read before placing
+        # them into the zone array
+        datalen = nrow * ncol
+
+        lay = 0
+        while lay < nlay:
+            header = next(lines, None)
+            if header is None:
+                break
+            rowitems = header.split()
             locat = rowitems[0].upper()
+            if locat not in __LOCATS:
+                raise Exception(f"Locat not recognized: {locat}")
 
             if locat == "CONSTANT":
-                iconst = int(rowitems[1])
-                vals = np.ones((nrow, ncol), dtype=int) * iconst
-                lay += 1
-                totlen += nrow * ncol
+                zones[lay, :, :] = int(rowitems[1])
+            elif locat == "INTERNAL":
+                # Data lines of the block - the block ends after datalen values (composite zones may follow)
+                tokens = []
+                while len(tokens) < datalen:
+                    line = next(lines, None)
+                    if line is None or line.split(maxsplit=1)[0].upper() in __LOCATS:
+                        break
+                    tokens.extend(line.split())
+                zones[lay, :, :] = __parse_values(tokens, datalen, "INTERNAL block").reshape((nrow, ncol))
             else:
-                fmt = rowitems[1].strip("()")
-                if len(rowitems) < 3:
-                    fmtin, iprn = [int(v) for v in fmt.split("I")]
-                else:
-                    fmtin = int(fmt.split("I")[0]) if len(fmt) > 0 else -1
-                    iprn = int(rowitems[2])
-
-
-        # ZONE DATA
-        else:
-            if locat == "INTERNAL":
-                # READ ZONES
-                rowvals = [int(v) for v in rowitems]
-                s = "Too many values encountered on this line."
-                if fmtin > 0:
-                    assert len(rowvals) <= fmtin, s
-                vals.extend(rowvals)
-
-            elif locat == "EXTERNAL":
                 # READ EXTERNAL FILE
-                fname = rowitems[0]
-                if not os.path.isfile(fname):
-                    errmsg = f'Could not find external file "{fname}"'
-                    raise Exception(errmsg)
-                with open(fname, "r") as ext_f:
-                    ext_flines = ext_f.readlines()
-                for ext_frow in ext_flines:
-                    ext_frowitems = ext_frow.strip().split()
-                    rowvals = [int(v) for v in ext_frowitems]
-                    vals.extend(rowvals)
-                if len(vals) != datalen:
-                    errmsg = (
-                        "The number of values read from external "
-                        'file "{}" does not match the expected '
-                        "number.".format(len(vals))
-                    )
-                    raise Exception(errmsg)
-            else:
-                # Should not get here
-                raise Exception(f"Locat not recognized: {locat}")
-
-                # IGNORE COMPOSITE ZONES
+                line = next(lines, None)
+                ext_fname = __find_external_file(line.split()[0] if line is not None else "", fname)
+                with open(ext_fname, "r") as ext_f:
+                    tokens = ext_f.read().split()
+                zones[lay, :, :] = __parse_values(tokens, datalen, f'external file "{ext_fname}"').reshape((nrow, ncol))
+            lay += 1
 
-            if len(vals) == datalen:
-                # place values for the previous layer into the zone array
-                vals = np.array(vals, dtype=int).reshape((nrow, ncol))
-                zones[lay, :, :] = vals[:, :]
-                lay += 1
-            totlen += len(rowitems)
-        i += 1
     s = (
         "The number of values read ({:,.0f})"
         " does not match the number expected"
-        " ({:,.0f})".format(totlen, nlay * nrow * ncol)
+        " ({:,.0f})".format(lay * datalen, nlay * datalen)
     )
-    assert totlen == nlay * nrow * ncol, s
+    assert lay == nlay, s
     return __split_into_shapes(zones[0])
 
 
-def __skip_comments(rowitems: List[str]):
-    to_parse = []
-    for item in rowitems:
-        if '#' in item:
-            break  # Skip comments
-        else:
-            to_parse.append(item)
-    return to_parse
+def __iterate_lines(f: TextIO) -> Iterator[str]:
+    """
+    Iterates over non-empty lines of the file with comments removed.
+    """
+    for line in f:
+        if '#' in line:
+            line = line.split('#', 1)[0]  # Skip comments
+        if line.strip():
+            yield line
+
+
+def __find_external_file(ext_fname: str, zone_fname: str) -> str:
+    if os.path.isfile(ext_fname):
+        return ext_fname
+    # Relative to the zone file
+    rel_fname = os.path.join(os.path.dirname(os.path.abspath(zone_fname)), ext_fname)
+    if ext_fname and os.path.isfile(rel_fname):
+        return rel_fname
+    raise Exception(f'Could not find external file "{ext_fname}"')
+
+
+def __parse_values(tokens: List[str], datalen: int, source: str) -> np.ndarray:
+    try:
+        vals = np.array(tokens, dtype=np.int32)
+    except ValueError as e:
+        raise Exception(f"Invalid zone value in {source}: {e}")
+    if len(vals) != datalen:
+        raise Exception(f"The number of values read from {source} ({len(vals)}) "
+                        f"does not match the expected number ({datalen}).")
+    return vals
 
 
 def __split_into_shapes(zones: np.ndarray) -> List[np.ndarray]:
-    group_iter = 1
-    shapes = []
-    while zones[zones == group_iter].any():
-        mask = np.zeros(zones.shape)
-        mask[zones == group_iter] = 1
-        shapes.append(mask)
-        group_iter += 1
-    return shapes
+    """
+    Creates float masks (1 inside the zone) of zones 1, 2, ... up to the first missing zone id - all in a single
+    pass over the zone array.
+    """
+    present_zones = np.unique(zones)
+    present_zones = present_zones[present_zones > 0]
+    # Zone ids are consecutive up to the first missing one
+    missing = present_zones != np.arange(1, len(present_zones) + 1)
+    zone_count = int(np.argmax(missing)) if missing.any() else len(present_zones)
+
+    flat_zones = zones.ravel()
+    in_shape = (flat_zones >= 1) & (flat_zones <= zone_count)
+    masks = np.zeros((zone_count, flat_zones.size))
+    masks[flat_zones[in_shape] - 1, np.flatnonzero(in_shape)] = 1
+    return list(masks.reshape((zone_count,) + zones.shape))
@@ -1,20 +1,16 @@
 import os
 from typing import Optional
 
+from ..local_fs_configuration import directory_index
+
 
 def scan_for_modflow_file(model_path: str, ext: str = ".nam") -> Optional[str]:
-    for file in os.listdir(model_path):
-        if file.endswith(ext):
-            return file
-    return None
+    return directory_index.find_file_with_extension(model_path, ext)
 
 
 def find_hydrus_file_path(hydrus_base_dir: str, file_name: str) -> Optional[str]:
-    try:
-        return os.path.join(hydrus_base_dir,
-                            next(f for f in os.listdir(hydrus_base_dir) if f.lower() == file_name.lower()))
-    except StopIteration:
-        return None
+    found_file = directory_index.find_file(hydrus_base_dir, file_name)
+    return os.path.join(hydrus_base_dir, found_file) if found_file else None
 
 
 def get_hydrus_model_length(selector_file_path: str) -> str:
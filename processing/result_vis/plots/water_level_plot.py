@@ -1,42 +1,42 @@
 import glob
 import os
+from typing import Dict
 
 import numpy as np
 from flopy.modflow import Modflow, ModflowBas
-from flopy.utils import FormattedHeadFile
 from matplotlib import pyplot as plt
 
-from hmse_simulations.hmse_projects.hmse_hydrological_models.processing.modflow import modflow_utils
+from hmse_simulations.hmse_projects.hmse_hydrological_models.processing.modflow import modflow_utils, \
+    modflow_head_reader
+from hmse_simulations.hmse_projects.hmse_hydrological_models.processing.local_fs_configuration.path_constants import \
+    RESULTS_STORE_DIR
+from hmse_simulations.hmse_projects.hmse_hydrological_models.processing.modflow.modflow_results_store import \
+    ModflowResultsStore
 
 
 def create_water_level_plot(project_local_path: str):
     plot_data = []
     t_counter = 0
 
-    shapes_for_zones = {}
-    for np_shape_path in glob.glob(os.path.join(project_local_path, "simulation", "shapes/*")):
-        shape_name = os.path.basename(np_shape_path)
-        shapes_for_zones[shape_name] = np.load(np_shape_path)
+    # Zone averages are gathered after each step of the simulation - no need to parse heads of each step again
+    results_store = ModflowResultsStore(os.path.join(project_local_path, "simulation", RESULTS_STORE_DIR))
+    zone_averages_per_step = results_store.read_zone_averages()
+    if not zone_averages_per_step:
+        # results store is filled by newer simulations only - heads of the steps are parsed as before
+        zone_averages_per_step = __read_zone_averages_from_step_dirs(project_local_path)
+    if not zone_averages_per_step:
+        raise ValueError(f"No Modflow results to plot in project {project_local_path}!")
 
     first_run = True
     labels = []
 
-    for step_dir in sorted(glob.glob(os.path.join(project_local_path, "simulation", "sim_step_*")), key=len):
+    for step in sorted(zone_averages_per_step.keys()):
         step_data = []
-        mf_model_path = glob.glob(os.path.join(step_dir, "modflow/*"))[0]
-        fhd_path = os.path.join(mf_model_path, modflow_utils.scan_for_modflow_file(mf_model_path, ext=".fhd"))
-        fhd_data = FormattedHeadFile(fhd_path).get_data()
-        model = Modflow.load(modflow_utils.scan_for_modflow_file(mf_model_path, ext=".nam"),
-                             model_ws=mf_model_path, load_only=["dis", "bas6"], forgive=True)
-        inbound = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas)).ibound[0].array
 
-        # TODO: load FHD
-        #  mask and avg on that?
-        for shape_name, shape_mask in shapes_for_zones.items():
-            avg_val_in_shape = np.average(inbound * shape_mask * fhd_data)
+        for shape_name, avg_val_in_shape in zone_averages_per_step[step].items():
             step_data.append(np.array([avg_val_in_shape]))
             if first_run:
-                labels.append(os.path.basename(shape_name))
+                labels.append(shape_name)
 
         first_run = False
 
@@ -65,3 +65,24 @@ def create_water_level_plot(project_local_path: str):
 
     plt.legend(labels)
     plt.show()
+
+
+def __read_zone_averages_from_step_dirs(project_local_path: str) -> Dict[int, Dict[str, float]]:
+    shapes_for_zones = {}
+    for np_shape_path in sorted(glob.glob(os.path.join(project_local_path, "simulation", "shapes/*"))):
+        shapes_for_zones[os.path.basename(np_shape_path)] = np.load(np_shape_path)
+
+    zone_averages_per_step = {}
+    for step_dir in glob.glob(os.path.join(project_local_path, "simulation", "sim_step_*")):
+        mf_model_path = glob.glob(os.path.join(step_dir, "modflow/*"))[0]
+        with modflow_head_reader.open_model_heads(mf_model_path) as head_data:
+            last_heads = head_data.get_data()
+        # step directories are read-only - no check report is written
+        model = Modflow.load(modflow_utils.scan_for_modflow_file(mf_model_path, ext=".nam"),
+                             model_ws=mf_model_path, load_only=["dis", "bas6"], forgive=True, check=False)
+        inbound = next(pkg for pkg in model.packagelist if isinstance(pkg, ModflowBas)).ibound[0].array
+        zone_averages_per_step[int(step_dir.split('_')[-1])] = {
+            shape_name: float(np.average(inbound * shape_mask * last_heads))
+            for shape_name, shape_mask in shapes_for_zones.items()
+        }
+    return zone_averages_per_step
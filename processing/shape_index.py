@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import List, Tuple, Optional, Dict
+
+import numpy as np
+
+from .local_fs_configuration import local_paths
+
+
+@dataclass
+class ShapeIndex:
+    """
+    Compact representation of all shapes of a project. Non-overlapping shapes are kept as a single label raster
+    (0 - no shape, i + 1 - i-th shape), overlapping ones as CSR cell lists (flat indices of cells of i-th shape are
+    indices[indptr[i]:indptr[i + 1]]).
+    """
+
+    shape_ids: List[str]
+    grid_shape: Tuple[int, int]
+    labels: Optional[np.ndarray] = None
+    indptr: Optional[np.ndarray] = None
+    indices: Optional[np.ndarray] = None
+    _shape_positions: Dict[str, int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # shape_id -> position in shape_ids (first occurrence)
+        self._shape_positions = {}
+        for shape_idx, shape_id in enumerate(self.shape_ids):
+            self._shape_positions.setdefault(shape_id, shape_idx)
+
+    @staticmethod
+    def from_masks(shape_ids: List[str], masks: List[np.ndarray]) -> 'ShapeIndex':
+        """
+        @param masks: Shape masks as saved by frontend - 1 inside the shape
+        """
+        grid_shape = tuple(masks[0].shape) if masks else (0, 0)
+        cells = [np.flatnonzero(mask == 1) for mask in masks]
+        indptr = np.concatenate([[0], np.cumsum([len(shape_cells) for shape_cells in cells])]).astype(np.int64)
+        indices = np.concatenate(cells).astype(np.int64) if cells else np.empty(0, dtype=np.int64)
+
+        if len(np.unique(indices)) < len(indices):
+            return ShapeIndex(list(shape_ids), grid_shape, indptr=indptr, indices=indices)
+
+        label_dtype = np.uint16 if len(shape_ids) < np.iinfo(np.uint16).max else np.uint32
+        labels = np.zeros(int(np.prod(grid_shape)), dtype=label_dtype)
+        labels[indices] = np.repeat(np.arange(1, len(shape_ids) + 1), np.diff(indptr))
+        return ShapeIndex(list(shape_ids), grid_shape, labels=labels.reshape(grid_shape))
+
+    @property
+    def is_overlapping(self) -> bool:
+        return self.labels is None
+
+    def get_cells(self, shape_id: str) -> np.ndarray:
+        """
+        @return: Flat (row-major) indices of cells of the shape
+        """
+        shape_idx = self.get_position(shape_id)
+        if self.is_overlapping:
+            return self.indices[self.indptr[shape_idx]:self.indptr[shape_idx + 1]]
+        return np.flatnonzero(self.labels == shape_idx + 1)
+
+    def get_position(self, shape_id: str) -> int:
+        """
+        @return: Position of the shape in shape_ids
+        """
+        if shape_id not in self._shape_positions:
+            raise ValueError(f"Shape {shape_id} is not in the index!")
+        return self._shape_positions[shape_id]
+
+    def get_mask(self, shape_id: str) -> np.ndarray:
+        return self.get_combined_mask([shape_id])
+
+    def get_combined_mask(self, shape_ids: List[str]) -> np.ndarray:
+        """
+        @return: Boolean mask of cells belonging to any of the given shapes
+        """
+        if not self.is_overlapping:
+            return np.isin(self.labels, [self.get_position(shape_id) + 1 for shape_id in shape_ids])
+        mask = np.zeros(int(np.prod(self.grid_shape)), dtype=bool)
+        for shape_id in shape_ids:
+            mask[self.get_cells(shape_id)] = True
+        return mask.reshape(self.grid_shape)
+
+    def zone_sums(self, values: np.ndarray, cell_filter: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        @param values: (rows, cols) array to reduce
+        @param cell_filter: Optional boolean (rows, cols) array - only cells marked True are taken into account
+        @return: Sum of values and number of cells in each shape (in order of shape_ids)
+        """
+        shape_count = len(self.shape_ids)
+        flat_values = np.asarray(values, dtype=np.float64).ravel()
+
+        if not self.is_overlapping:
+            flat_labels = self.labels.ravel().astype(np.int64)
+            if cell_filter is not None:
+                flat_labels = np.where(np.asarray(cell_filter).ravel(), flat_labels, 0)
+            sums = np.bincount(flat_labels, weights=flat_values, minlength=shape_count + 1)[1:]
+            counts = np.bincount(flat_labels, minlength=shape_count + 1)[1:]
+            return sums, counts
+
+        shape_of_cell = np.repeat(np.arange(shape_count), np.diff(self.indptr))
+        cells = self.indices
+        if cell_filter is not None:
+            kept = np.asarray(cell_filter).ravel()[cells]
+            shape_of_cell, cells = shape_of_cell[kept], cells[kept]
+        sums = np.bincount(shape_of_cell, weights=flat_values[cells], minlength=shape_count)
+        counts = np.bincount(shape_of_cell, minlength=shape_count)
+        return sums, counts
+
+    def zone_means(self, values: np.ndarray, cell_filter: Optional[np.ndarray] = None) -> np.ndarray:
+        sums, counts = self.zone_sums(values, cell_filter)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts
+
+    def zone_means_by_id(self, values: np.ndarray, cell_filter: Optional[np.ndarray] = None) -> Dict[str, float]:
+        return dict(zip(self.shape_ids, self.zone_means(values, cell_filter).tolist()))
+
+    def save(self, index_path: str, sources_signature: List) -> None:
+        arrays = {"labels": self.labels} if not self.is_overlapping else {"indptr": self.indptr,
+                                                                           "indices": self.indices}
+        index_info = {"shape_ids": self.shape_ids,
+                      "grid_shape": list(self.grid_shape),
+                      "sources_signature": sources_signature}
+        # Written to unique temporary files first - index may be built concurrently by several workers
+        npz_fd, npz_tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path),
+                                                prefix=os.path.basename(index_path), suffix=".npz.tmp")
+        json_fd, json_tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path),
+                                                  prefix=os.path.basename(index_path), suffix=".json.tmp")
+        try:
+            with os.fdopen(npz_fd, 'wb') as fp:
+                np.savez(fp, **arrays)
+            with os.fdopen(json_fd, 'w', encoding='utf-8') as fp:
+                json.dump({"shape_ids": self.shape_ids,
+                           "grid_shape": list(self.grid_shape),
+                           "sources_signature": sources_signature}, fp)
+            os.replace(npz_tmp_path, f"{index_path}.npz")
+            os.replace(json_tmp_path, f"{index_path}.json")
+        except BaseException:
+            for tmp_path in (npz_tmp_path, json_tmp_path):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def load(index_path: str) -> Tuple['ShapeIndex', List]:
+        with open(f"{index_path}.json", 'r', encoding='utf-8') as fp:
+            index_info = json.load(fp)
+        with np.load(f"{index_path}.npz") as arrays:
+            shape_index = ShapeIndex(index_info["shape_ids"], tuple(index_info["grid_shape"]),
+                                     labels=arrays["labels"] if "labels" in arrays else None,
+                                     indptr=arrays["indptr"] if "indptr" in arrays else None,
+                                     indices=arrays["indices"] if "indices" in arrays else None)
+        return shape_index, index_info["sources_signature"]
+
+
+__loaded_indexes: Dict[str, Tuple[ShapeIndex, List]] = {}
+
+
+def get_shape_index(project_id: str) -> ShapeIndex:
+    """
+    Returns index of shapes of the project. Index is built from shape masks (.npy files saved by frontend) once
+    and rebuilt only when the masks change.
+    """
+
+    shapes_dir = local_paths.get_shapes_dir(project_id)
+    sources_signature = __get_sources_signature(shapes_dir)
+
+    if project_id in __loaded_indexes and __loaded_indexes[project_id][1] == sources_signature:
+        return __loaded_indexes[project_id][0]
+
+    index_path = local_paths.get_shape_index_path(project_id)
+    shape_index = None
+    if os.path.isfile(f"{index_path}.json") and os.path.isfile(f"{index_path}.npz"):
+        saved_index, saved_signature = ShapeIndex.load(index_path)
+        if saved_signature == sources_signature:
+            shape_index = saved_index
+
+    if shape_index is None:
+        shape_ids = [shape_file[:-len(".npy")] for shape_file, _, _ in sources_signature]
+        shape_index = ShapeIndex.from_masks(shape_ids, [np.load(local_paths.get_shape_path(project_id, shape_id))
+                                                        for shape_id in shape_ids])
+        if os.path.isdir(os.path.dirname(index_path)):
+            shape_index.save(index_path, sources_signature)
+
+    __loaded_indexes[project_id] = (shape_index, sources_signature)
+    return shape_index
+
+
+def __get_sources_signature(shapes_dir: str) -> List:
+    if not os.path.isdir(shapes_dir):
+        return []
+    with os.scandir(shapes_dir) as entries:
+        return sorted([entry.name, entry.stat().st_size, entry.stat().st_mtime_ns]
+                      for entry in entries if entry.is_file() and entry.name.endswith(".npy"))
@@ -1,14 +1,13 @@
-import json
 import os
 import shutil
-from typing import Dict, Union
-
-import flopy
-import numpy as np
+from typing import Dict, Union, Optional
 
+from .. import worker_pool
 from ..hydrus import hydrus_utils, hydrus_model_management
-from ..local_fs_configuration import local_paths, feedback_loop_file_management
-from ..modflow import modflow_utils, modflow_model_management
+from ..local_fs_configuration import local_paths, feedback_loop_file_management, model_cloning
+from ..modflow import modflow_model_management, modflow_model_cache, modflow_head_reader, modflow_output_writer, \
+    modflow_results_store
+from ..modflow.modflow_output_writer import OutputFormat
 
 
 def local_files_initialization(project_id: str, **kwargs):
@@ -16,46 +15,64 @@ def local_files_initialization(project_id: str, **kwargs):
 
     shutil.rmtree(sim_dir, ignore_errors=True)
     os.makedirs(sim_dir)
-    shutil.copytree(local_paths.get_hydrus_dir(project_id),
-                    local_paths.get_hydrus_dir(project_id, simulation_mode=True))
-    shutil.copytree(local_paths.get_modflow_dir(project_id),
-                    local_paths.get_modflow_dir(project_id, simulation_mode=True))
+    model_cloning.clone_tree(local_paths.get_hydrus_dir(project_id),
+                             local_paths.get_hydrus_dir(project_id, simulation_mode=True))
+    model_cloning.clone_tree(local_paths.get_modflow_dir(project_id),
+                             local_paths.get_modflow_dir(project_id, simulation_mode=True))
 
 
 def preserve_reference_hydrus_models(project_id: str, **kwargs):
-    shutil.copytree(local_paths.get_hydrus_dir(project_id, simulation_mode=True),
-                    local_paths.get_hydrus_dir(project_id, simulation_mode=True, simulation_ref=True))
+    model_cloning.clone_tree(local_paths.get_hydrus_dir(project_id, simulation_mode=True),
+                             local_paths.get_hydrus_dir(project_id, simulation_mode=True, simulation_ref=True))
 
 
-def extract_output_to_json(project_id: str, modflow_id: str, **kwargs):
+def extract_output_to_json(project_id: str, modflow_id: str, output_format: str = OutputFormat.json,
+                           output_precision: Optional[int] = None, **kwargs):
     modflow_dir = local_paths.get_modflow_model_path(project_id, modflow_id, simulation_mode=True)
-    nam_file = modflow_utils.scan_for_modflow_file(modflow_dir)
-    modflow_model = flopy.modflow.Modflow.load(nam_file, model_ws=modflow_dir, forgive=True)
-    fhd_path = os.path.join(modflow_dir, modflow_utils.scan_for_modflow_file(modflow_dir, ext=".fhd"))
-    modflow_output = flopy.utils.formattedfile.FormattedHeadFile(fhd_path, precision="single")
+    modflow_model = modflow_model_cache.load_model(modflow_dir)
+
+    with modflow_head_reader.open_model_heads(modflow_dir) as modflow_output:
+        modflow_output_writer.write_output(
+            periods=(modflow_output.get_data(idx=stress_period) for stress_period in range(modflow_model.nper)),
+            period_count=modflow_model.nper,
+            output_path=local_paths.get_output_path(project_id, output_format),
+            output_format=OutputFormat(output_format),
+            float_precision=output_precision
+        )
+
 
-    result_fhd = np.array([modflow_output.get_data(idx=stress_period)
-                           for stress_period in range(modflow_model.nper)])
+def extract_feedback_loop_output(project_id: str, modflow_id: str, output_format: str = OutputFormat.json,
+                                 output_precision: Optional[int] = None, **kwargs):
+    """
+    Writes heads of all steps of the feedback loop (gathered after each iteration, followed by the last Modflow run)
+    to a separate output - results of the last run are written by extract_output_to_json.
+    """
 
-    with open(local_paths.get_output_json_path(project_id), 'w') as handle:
-        json.dump(result_fhd.tolist(), handle, indent=2)
-        modflow_output.close()
+    periods, period_count = modflow_results_store.get_feedback_loop_periods(project_id, modflow_id)
+    modflow_output_writer.write_output(periods=periods,
+                                       period_count=period_count,
+                                       output_path=local_paths.get_feedback_loop_output_path(project_id,
+                                                                                            output_format),
+                                       output_format=OutputFormat(output_format),
+                                       float_precision=output_precision)
 
 
 def initialize_feedback_iteration(project_id: str, modflow_id: str, spin_up: int,
                                   shapes_to_hydrus: Dict[str, Union[str, float]],
+                                  workers: int = 1,
                                   **kwargs):
     modflow_model_management.prepare_model_for_next_iteration(project_id, modflow_id)
     hydrus_ids_data = hydrus_utils.get_compound_hydrus_ids_for_feedback_loop(shapes_to_hydrus)
-    
-    for ref_hydrus_id, compound_hydrus_id in hydrus_ids_data:
-        hydrus_model_management.prepare_model_for_next_iteration(
-            project_id=project_id,
-            ref_hydrus_id=ref_hydrus_id,
-            compound_hydrus_id=compound_hydrus_id,
-            spin_up=spin_up
-        )
-        
+
+    # Compound models are independent of each other - prepare them in parallel
+    worker_pool.run_tasks(hydrus_model_management.prepare_model_for_next_iteration,
+                          tasks={compound_hydrus_id: {"project_id": project_id,
+                                                      "ref_hydrus_id": ref_hydrus_id,
+                                                      "compound_hydrus_id": compound_hydrus_id,
+                                                      "spin_up": spin_up}
+                                 for ref_hydrus_id, compound_hydrus_id in hydrus_ids_data},
+                          workers=workers)
+
 
 def create_hydrus_models_for_zones(project_id: str, shapes_to_hydrus: Dict[str, Union[str, float]], **kwargs):
     hydrus_to_shapes = hydrus_utils.get_hydrus_to_shapes_mapping(shapes_to_hydrus)
@@ -63,8 +80,9 @@ def create_hydrus_models_for_zones(project_id: str, shapes_to_hydrus: Dict[str,
                                                                  used_hydrus_models=hydrus_to_shapes)
 
 
-def pre_configure_iteration(project_id: str, **kwargs):
+def pre_configure_iteration(project_id: str, modflow_id: str, **kwargs):
     feedback_loop_file_management.pre_configure_iteration(project_id)
+    modflow_results_store.append_simulation_step(project_id, modflow_id)
 
 
 def cleanup_project_volume(project_id: str, **kwargs):
@@ -8,7 +8,9 @@ from ..modflow.modflow_metadata import ModflowMetadata
 def weather_data_transfer_to_hydrus(project_id: str, start_date: str, spin_up: int,
                                     modflow_metadata: ModflowMetadata,
                                     hydrus_to_weather: Dict[str, str],
-                                    shapes_to_hydrus: Dict[str, Union[str, float]], **kwargs):
+                                    shapes_to_hydrus: Dict[str, Union[str, float]],
+                                    workers: int = 1,
+                                    **kwargs):
     hydrus_to_weather_mapping = {hydrus_id: hydrus_to_weather[hydrus_id]
                                  for hydrus_id in hydrus_utils.get_used_hydrus_models(shapes_to_hydrus)
                                  if hydrus_id in hydrus_to_weather}
@@ -18,7 +20,8 @@ def weather_data_transfer_to_hydrus(project_id: str, start_date: str, spin_up: i
         hydrus_to_weather_mapping=hydrus_to_weather_mapping,
         start_date=start_date,
         spin_up=spin_up,
-        modflow_metadata=modflow_metadata
+        modflow_metadata=modflow_metadata,
+        workers=workers
     )
 
 
@@ -41,36 +44,41 @@ def transfer_data_from_hydrus_to_modflow(project_id: str, shapes_to_hydrus: Dict
 def transfer_data_from_modflow_to_hydrus(project_id: str,
                                          shapes_to_hydrus: Dict[str, Union[str, float]],
                                          modflow_metadata: ModflowMetadata,
+                                         workers: int = 1,
                                          **kwargs):
     __transfer_from_modflow_to_hydrus(
         project_id=project_id,
         shapes_to_hydrus=shapes_to_hydrus,
         modflow_metadata=modflow_metadata,
-        use_modflow_results=True
+        use_modflow_results=True,
+        workers=workers
     )
 
 
 def transfer_data_from_modflow_to_hydrus_init_transient(project_id: str,
                                                         shapes_to_hydrus: Dict[str, Union[str, float]],
                                                         modflow_metadata: ModflowMetadata,
+                                                        workers: int = 1,
                                                         **kwargs):
     __transfer_from_modflow_to_hydrus(
         project_id=project_id,
         shapes_to_hydrus=shapes_to_hydrus,
         modflow_metadata=modflow_metadata,
-        use_modflow_results=False
+        use_modflow_results=False,
+        workers=workers
     )
 
 
 def __transfer_from_modflow_to_hydrus(project_id: str,
                                       shapes_to_hydrus: Dict[str, Union[str, float]],
                                       modflow_metadata: ModflowMetadata,
-                                      use_modflow_results: bool):
-    for shape_id, plain_hydrus_id in shapes_to_hydrus.items():
-        if not isinstance(plain_hydrus_id, str):
-            continue
-        data_passing_utils.transfer_water_level_to_hydrus(project_id,
-                                                          plain_hydrus_id,
-                                                          modflow_metadata,
-                                                          shape_id,
-                                                          use_modflow_results)
+                                      use_modflow_results: bool,
+                                      workers: int = 1):
+    data_passing_utils.transfer_water_levels_to_hydrus(
+        project_id=project_id,
+        shapes_to_hydrus={shape_id: plain_hydrus_id for shape_id, plain_hydrus_id in shapes_to_hydrus.items()
+                          if isinstance(plain_hydrus_id, str)},
+        modflow_metadata=modflow_metadata,
+        use_modflow_results=use_modflow_results,
+        workers=workers
+    )
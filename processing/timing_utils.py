@@ -0,0 +1,30 @@
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator
+
+
+@dataclass
+class StageTimer:
+    """
+    Measures durations of consecutive named stages of a longer operation (e.g. model upload).
+    """
+
+    name: str
+    stage_times: Dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def stage(self, stage_name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[stage_name] = self.stage_times.get(stage_name, 0.0) + time.perf_counter() - start
+
+    def get_total_time(self) -> float:
+        return sum(self.stage_times.values())
+
+    def log(self, level: int = logging.INFO) -> None:
+        stages = ", ".join(f"{stage_name}: {duration:.3f}s" for stage_name, duration in self.stage_times.items())
+        logging.log(level, f"{self.name} took {self.get_total_time():.3f}s ({stages})")
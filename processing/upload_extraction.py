@@ -0,0 +1,107 @@
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+from typing import Callable, Optional, Tuple, List
+from zipfile import ZipFile, ZipInfo
+
+from . import model_config
+from .local_fs_configuration import directory_index
+from .model_exceptions import UploadLimitExceededError
+
+__CHUNK_SIZE = 1024 * 1024
+# Metadata added to archives by archivers/OS - never needed by the models
+__JUNK_MEMBER_PREFIXES = ("__MACOSX/",)
+__JUNK_MEMBER_NAMES = {".DS_Store", "Thumbs.db"}
+
+# Member name -> (target name relative to the destination directory, whether to convert CRLF to LF)
+MemberHandler = Callable[[str], Tuple[str, bool]]
+
+
+def extract_uploaded_archive(uploaded_archive, dst_dir: os.PathLike,
+                             member_handler: Optional[MemberHandler] = None,
+                             max_bytes: int = model_config.MAX_UPLOAD_EXTRACTED_BYTES,
+                             max_members: int = model_config.MAX_UPLOAD_MEMBER_COUNT) -> List[str]:
+    """
+    Extracts uploaded ZIP archive directly from the upload stream (archive is not saved to disk first).
+    Members can be renamed and have their line endings normalized while they are extracted.
+
+    @param uploaded_archive: Uploaded file (werkzeug FileStorage)
+    @param dst_dir: Directory to extract the archive to
+    @param member_handler: Decides target name and line ending normalization of each member
+    @param max_bytes: Limit of the total size of extracted files
+    @param max_members: Limit of the number of extracted files
+    @return: Paths of extracted files
+    """
+
+    with __open_seekable_stream(uploaded_archive) as stream, ZipFile(stream, 'r') as archive:
+        members = [member for member in archive.infolist() if not __is_skipped(member)]
+        if len(members) > max_members:
+            raise UploadLimitExceededError(description=f"Uploaded archive contains too many files "
+                                                       f"({len(members)}, limit: {max_members})!")
+        if sum(member.file_size for member in members) > max_bytes:
+            raise UploadLimitExceededError(description=f"Uploaded archive is too large after extraction "
+                                                       f"(limit: {max_bytes} bytes)!")
+
+        extracted_files = []
+        extracted_bytes = 0
+        for member in members:
+            target_name, normalize_newlines = member_handler(member.filename) if member_handler \
+                else (member.filename, False)
+            target_path = __get_safe_target_path(dst_dir, target_name)
+            if target_path is None:
+                logging.warning(f"Skipping archive member outside of the extraction directory: {member.filename}")
+                continue
+
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with archive.open(member) as src, open(target_path, 'wb') as dst:
+                extracted_bytes += __copy_member(src, dst, normalize_newlines, max_bytes - extracted_bytes)
+            extracted_files.append(target_path)
+
+    directory_index.invalidate_tree(dst_dir)
+    return extracted_files
+
+
+def __open_seekable_stream(uploaded_archive):
+    stream = uploaded_archive.stream
+    if stream.seekable():
+        stream.seek(0)
+        return nullcontext(stream)  # upload stream is owned by the request - it is not closed here
+
+    # Stream has to be seekable for ZipFile - spool it (kept in memory if small enough)
+    spooled = tempfile.SpooledTemporaryFile(max_size=64 * __CHUNK_SIZE)
+    shutil.copyfileobj(stream, spooled, __CHUNK_SIZE)
+    spooled.seek(0)
+    return spooled
+
+
+def __is_skipped(member: ZipInfo) -> bool:
+    return member.is_dir() \
+        or member.filename.startswith(__JUNK_MEMBER_PREFIXES) \
+        or os.path.basename(member.filename) in __JUNK_MEMBER_NAMES
+
+
+def __get_safe_target_path(dst_dir: os.PathLike, member_name: str) -> Optional[str]:
+    dst_dir = os.path.abspath(dst_dir)
+    target_path = os.path.abspath(os.path.join(dst_dir, member_name))
+    if os.path.commonpath([dst_dir, target_path]) != dst_dir or target_path == dst_dir:
+        return None
+    return target_path
+
+
+def __copy_member(src, dst, normalize_newlines: bool, bytes_left: int) -> int:
+    written = 0
+    pending_cr = b''
+    for chunk in iter(lambda: src.read(__CHUNK_SIZE), b''):
+        if normalize_newlines:
+            # CR of a CRLF pair may end the chunk - it is decided on with the next chunk
+            chunk = (pending_cr + chunk).replace(b'\r\n', b'\n')
+            pending_cr = b'\r' if chunk.endswith(b'\r') else b''
+            chunk = chunk[:-1] if pending_cr else chunk
+        written += len(chunk)
+        if written > bytes_left:
+            raise UploadLimitExceededError(description="Uploaded archive is too large after extraction!")
+        dst.write(chunk)
+    dst.write(pending_cr)
+    return written + len(pending_cr)
@@ -1,87 +1,141 @@
-import csv
+import hashlib
 import logging
-from collections import defaultdict
+import os
 from datetime import datetime
-from typing import Optional
+from typing import Optional, TextIO, Dict, List, Tuple
 
-from .. import julian_calendar_manager
-from ..hydrus import hydrus_utils
-from ..hydrus.file_processing.selector_in_processor import SelectorInProcessor
+import numpy as np
+import pandas as pd
 
+from ..hydrus.hydrus_model import HydrusModel
 
-def read_weather_csv(filepath: str, start_date: Optional[datetime] = None, record_count: Optional[int] = None):
+WEATHER_CACHE_SUFFIX = ".npz"
+__CACHE_COLUMNS_KEY = "columns"
+__CACHE_SOURCE_KEY = "source"
+__ROW_SEPARATOR = "|"
+
+
+def read_weather_csv(filepath: str, start_date: Optional[datetime] = None,
+                     record_count: Optional[int] = None, cache_dir: Optional[str] = None) -> Dict[str, np.ndarray]:
     """
     Reads the data from a SWAT weather data .csv file. Returns the data as a dict.
+    The parsed file is cached in a binary file in the cache directory, reused as long as the .csv is unchanged
+    (the .csv and its directory are never modified).
 
     :param filepath: the path to the file we want to read from
-    :return: a dictionary of {str: list}, a mapping of column names to lists of values in said columns
+    :param cache_dir: directory of the parsed files cache, None to parse the file without caching
+    :param start_date: date of the first record to read, None to read from the beginning of the file
+    :param record_count: maximal number of records to read, None to read till the end of the file
+    :return: a dictionary of {str: np.ndarray}, a mapping of column names to arrays of values in said columns,
+             dates are given as consecutive julian days starting from the julian day of the first record
     """
 
-    data = defaultdict(list)
-    file = open(filepath)
-    reader = csv.DictReader(file)
-    jul_day_iter = -1
-
-    found_start_date = start_date is None
-    # start_date_parts = parsed_start_date.split('-')
-    # start_date_str = '/'.join((start_date_parts[1], start_date_parts[2], start_date_parts[0]))
-
-    for line in reader:
-        data_read = False
-        for column, value in line.items():
-            # if column == "Date" and value == start_date_str:
-            if column == "Date":
-                date_parts = list(map(int, value.split('/')))
-                dt_date = datetime(month=date_parts[0], day=date_parts[1], year=date_parts[2])
-                if dt_date == start_date:
-                    found_start_date = True
-
-            if not found_start_date:
-                continue
-
-            # a None pops up among the keys for some reason, ignore it
-            if column is None:
-                continue
-
-            # for everything except date cast the numeric string to a true float
-            if column != "Date":
-                value = float(value)
-            else:
-                if jul_day_iter <= 0:
-                    jul_day_iter = julian_calendar_manager.date_to_julian(value)
-                value = jul_day_iter
-                jul_day_iter += 1
-
-            data_read = True
-            data[column].append(value)
-
-        if data_read and record_count is not None:
-            record_count -= 1
-            if record_count <= 0:
-                break
-
+    columns, dates = __load_weather_table(filepath, cache_dir)
+
+    start_idx = 0
+    if start_date is not None:
+        matching_idx = np.flatnonzero(dates == np.datetime64(start_date, 'D'))
+        start_idx = matching_idx[0] if matching_idx.size else len(dates)
+    end_idx = len(dates) if record_count is None else start_idx + record_count
+
+    data = {}
+    for column, values in columns.items():
+        if column == DATE:
+            selected_dates = dates[start_idx:end_idx]
+            first_jul_day = 0
+            if selected_dates.size:
+                first_jul_day = (selected_dates[0] - selected_dates[0].astype('datetime64[Y]')).astype(int) + 1
+            data[column] = first_jul_day + np.arange(selected_dates.size, dtype=np.int64)
+        else:
+            data[column] = values[start_idx:end_idx]
     return data
 
 
+def __load_weather_table(filepath: str, cache_dir: Optional[str]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """
+    @return: Columns of the weather file (numeric columns as float arrays) and dates of the records
+    """
+
+    cache_path = None
+    if cache_dir is not None:
+        # cache entry of the file path, valid as long as mtime and size of the file are the same
+        source_path = os.path.abspath(filepath)
+        stat = os.stat(source_path)
+        source_signature = np.array([source_path, str(stat.st_mtime_ns), str(stat.st_size)])
+        cache_path = os.path.join(cache_dir,
+                                  hashlib.sha1(source_path.encode('utf-8')).hexdigest() + WEATHER_CACHE_SUFFIX)
+        cached_table = __read_cached_table(cache_path, source_signature)
+        if cached_table is not None:
+            return cached_table
+
+    # index_col=False - rows may end with a trailing delimiter, values parsed exactly as float() would
+    table = pd.read_csv(filepath, index_col=False, float_precision="round_trip")
+    dates = __parse_dates(table[DATE])
+    columns = {column: (dates if column == DATE else table[column].to_numpy(dtype=np.float64))
+               for column in table.columns}
+
+    if cache_path is not None:
+        __write_cached_table(cache_path, source_signature, columns)
+    return columns, dates
+
+
+def __parse_dates(date_column: pd.Series) -> np.ndarray:
+    # Format: M/D/YYYY - composed from the parts, much faster than parsing the dates one by one
+    month, day, year = date_column.str.split('/', expand=True).astype(np.int64).to_numpy().T
+    months = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1).astype('timedelta64[M]')
+    return months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+
+
+def __read_cached_table(cache_path: str,
+                        source_signature: np.ndarray) -> Optional[Tuple[Dict[str, np.ndarray], np.ndarray]]:
+    if not os.path.isfile(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if not np.array_equal(cache[__CACHE_SOURCE_KEY], source_signature):
+                return None
+            column_names = cache[__CACHE_COLUMNS_KEY].tolist()
+            columns = {column: cache[f"column_{i}"] for i, column in enumerate(column_names)}
+    except (OSError, ValueError, KeyError):
+        logging.warning(f"Ignoring unreadable weather cache file: {cache_path}")
+        return None
+    return columns, columns[DATE]
+
+
+def __write_cached_table(cache_path: str, source_signature: np.ndarray, columns: Dict[str, np.ndarray]) -> None:
+    column_names: List[str] = list(columns.keys())
+    arrays = {f"column_{i}": columns[column] for i, column in enumerate(column_names)}
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'wb') as fp:
+            np.savez(fp, **{__CACHE_COLUMNS_KEY: np.array(column_names), __CACHE_SOURCE_KEY: source_signature},
+                     **arrays)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        logging.warning(f"Could not write weather cache file: {cache_path}")
+
+
 # TODO: enum on the units?
-def adapt_data(data: dict, hydrus_dist_unit: str, start_date=None):
+def adapt_data(data: Dict[str, np.ndarray], hydrus_dist_unit: str, start_date=None) -> Dict[str, np.ndarray]:
     """
     Adapts the raw weather file data for use with hydrus - changes wind speed from m/s to km/day,
     humidity from fractions to percentages (0-100) and scales daily rainfall to the appropriate unit
 
-    :param data: the data we want to adapt
+    :param data: the data we want to adapt - left unchanged
     :param hydrus_dist_unit: the unit of distance used in the hydrus model we'll be modifying - "m", "cm" or "mm"
-    :return: the modified data
+    :return: the adapted data
     """
-    #                   to  min  hr   day  km
-    data["Wind"] = [speed * 60 * 60 * 24 / 1000 for speed in data["Wind"]]
+    data = dict(data)
+    #                                    to  min  hr   day  km
+    data[WIND] = np.asarray(data[WIND], dtype=np.float64) * 60 * 60 * 24 / 1000
 
-    data["Relative Humidity"] = [value * 100 for value in data["Relative Humidity"]]
+    data[RH_MEAN] = np.asarray(data[RH_MEAN], dtype=np.float64) * 100
 
     if hydrus_dist_unit == "m":
-        data["Precipitation"] = [value / 1000 for value in data["Precipitation"]]
+        data[PRECIPITATION] = np.asarray(data[PRECIPITATION], dtype=np.float64) / 1000
     elif hydrus_dist_unit == "cm":
-        data["Precipitation"] = [value / 10 for value in data["Precipitation"]]
+        data[PRECIPITATION] = np.asarray(data[PRECIPITATION], dtype=np.float64) / 10
     elif hydrus_dist_unit == "mm":
         pass
 
@@ -98,41 +152,57 @@ RH_MEAN = 'Relative Humidity'
 WIND = 'Wind'
 PRECIPITATION = 'Precipitation'
 
+# Data columns in METEO.IN table order
+METEO_COLUMNS = [DATE, RAD, T_MAX, T_MIN, RH_MEAN, WIND]
+HYDRUS_WEATHER_COLUMNS = METEO_COLUMNS + [PRECIPITATION]
+
 
-def add_weather_to_hydrus_model(model_path: str, data: dict):
+def format_weather_data(data: Dict[str, np.ndarray]) -> Dict[str, List[str]]:
+    """
+    Formats the weather data columns written to Hydrus input files - formatting dominates the cost of applying
+    the data, so the result can be reused for every model receiving the same data.
+
+    :param data: a dictionary with the adapted weather data
+    :return: a dictionary of {str: list}, a mapping of column names to formatted values in said columns
+    """
+    return {column: list(map(str, np.asarray(data[column]).tolist()))
+            for column in HYDRUS_WEATHER_COLUMNS if column in data}
+
+
+def add_weather_to_hydrus_model(hydrus_model: HydrusModel, data: dict,
+                                formatted_data: Optional[Dict[str, List[str]]] = None):
     """
     Enriches the target hydrus model with weather file data.
 
-    :param model_path: the path of the model to modify
+    :param hydrus_model: the model to modify - changes are written to the files by hydrus_model.flush()
     :param data: a dictionary with the loaded weather data
+    :param formatted_data: the data formatted by format_weather_data, formatted here if not given
     :return: success - boolean, true if model was updated successfully, false otherwise
     """
 
+    if formatted_data is None:
+        formatted_data = format_weather_data(data)
+
     # modify meteo file if it exists, return if encountered issues
-    meteo_path = hydrus_utils.find_hydrus_file_path(model_path, file_name="meteo.in")
-    if meteo_path:
-        meteo_file_modified = __modify_meteo_file(meteo_path, data)
+    if hydrus_model.has_file("meteo.in"):
+        meteo_file_modified = __modify_meteo_file(hydrus_model.edit_file("meteo.in"), data, formatted_data)
         if not meteo_file_modified:
             return False
 
     # modify atmosph file is it exists
     replace_rain = PRECIPITATION in data.keys()
-    atmosph_path = hydrus_utils.find_hydrus_file_path(model_path, file_name="atmosph.in")
-    if replace_rain and atmosph_path:
-        atmosph_file_modified = __modify_atmosph_file(atmosph_path, data)
+    if replace_rain and hydrus_model.has_file("atmosph.in"):
+        atmosph_file_modified = __modify_atmosph_file(hydrus_model.edit_file("atmosph.in"), formatted_data)
         if not atmosph_file_modified:
             return False
 
-    selector_path = hydrus_utils.find_hydrus_file_path(model_path, file_name="selector.in")
-    if selector_path:
-        with open(selector_path, 'r+', encoding='utf-8') as fp:
-            SelectorInProcessor(fp).update_initial_and_final_step(data[DATE][0], data[DATE][-1])
+    if hydrus_model.has_file("selector.in"):
+        hydrus_model.update_initial_and_final_step(data[DATE][0], data[DATE][-1])
 
     return True
 
 
-def __modify_meteo_file(meteo_file_path, data):
-    meteo_file = open(meteo_file_path, "r+")
+def __modify_meteo_file(meteo_file: TextIO, data, formatted_data: Dict[str, List[str]]):
 
     old_file_lines = meteo_file.readlines()
     # remove trailing empty lines from end of file
@@ -152,13 +222,6 @@ def __modify_meteo_file(meteo_file_path, data):
             i += 1
             break
 
-    # check which fields we have data about
-    replace_rad = RAD in data.keys()
-    replace_tmax = T_MAX in data.keys()
-    replace_tmin = T_MIN in data.keys()
-    replace_rhmean = RH_MEAN in data.keys()
-    replace_wind = WIND in data.keys()
-
     # navigate to table start
     while True:
         curr_line = old_file_lines[i]
@@ -172,42 +235,21 @@ def __modify_meteo_file(meteo_file_path, data):
             break
 
     # write new table values, only change columns for which we have data
-    for data_row in range(len(data[DATE])):
-        # break if reached end of file
-        curr_line = old_file_lines[i]
-        if "end" in curr_line:
-            new_file_lines.append(curr_line)
-            break
-
-        curr_row = old_file_lines[i].split()
-        curr_row[0] = data[DATE][data_row]
-        if replace_rad:
-            curr_row[1] = data[RAD][data_row]
-        if replace_tmax:
-            curr_row[2] = data[T_MAX][data_row]
-        if replace_tmin:
-            curr_row[3] = data[T_MIN][data_row]
-        if replace_rhmean:
-            curr_row[4] = data[RH_MEAN][data_row]
-        if replace_wind:
-            curr_row[5] = data[WIND][data_row]
-
-        new_file_lines.append(__build_line(curr_row))
-
-        i += 1
-        data_row += 1
+    replaced_columns = {col_idx: formatted_data[column] for col_idx, column in enumerate(METEO_COLUMNS)
+                        if column in formatted_data}
+    new_table = __build_table(old_file_lines, i, len(formatted_data[DATE]), replaced_columns)
+    if new_table is None:
+        return False
 
     # overwrite file
     meteo_file.seek(0)
-    meteo_file.writelines(new_file_lines)
+    meteo_file.write("".join(new_file_lines) + new_table)
     meteo_file.truncate()
-    meteo_file.close()
 
     return True
 
 
-def __modify_atmosph_file(atmosph_file_path, data):
-    atmosph_file = open(atmosph_file_path, "r+")
+def __modify_atmosph_file(atmosph_file: TextIO, formatted_data: Dict[str, List[str]]):
 
     old_file_lines = atmosph_file.readlines()
     # remove trailing empty lines from end of file
@@ -226,31 +268,59 @@ def __modify_atmosph_file(atmosph_file_path, data):
             break
 
     # modify table
-    for data_row in range(len(data[DATE])):
-
-        # break if reached end of file
-        curr_line = old_file_lines[i]
-        if "end" in curr_line:
-            new_file_lines.append(curr_line)
-            break
-
-        curr_row = old_file_lines[i].split()
-        curr_row[0] = data[DATE][data_row]
-        curr_row[1] = data[PRECIPITATION][data_row]
-        new_file_lines.append(__build_line(curr_row))
-
-        i += 1
-        data_row += 1
+    new_table = __build_table(old_file_lines, i, len(formatted_data[DATE]),
+                              {0: formatted_data[DATE], 1: formatted_data[PRECIPITATION]})
+    if new_table is None:
+        return False
 
     # overwrite file
     atmosph_file.seek(0)
-    atmosph_file.writelines(new_file_lines)
+    atmosph_file.write("".join(new_file_lines) + new_table)
     atmosph_file.truncate()
-    atmosph_file.close()
 
     return True
 
 
+def __build_table(file_lines: List[str], table_start: int, record_count: int,
+                  replaced_columns: Dict[int, List[str]]) -> Optional[str]:
+    """
+    Rewrites up to record_count table rows (until the "end" line, which is kept) with the given column values,
+    remaining rows are not kept. Rows are rebuilt column-wise and joined at once, in the same format as __build_line.
+
+    @param replaced_columns: Mapping of column indices to formatted values of the column, starting from the first row
+    @return: Content replacing the table, None if the table ends before the end line is reached
+    """
+
+    rows = file_lines[table_start:table_start + record_count]
+    end_line_idx = next((idx for idx, line in enumerate(rows) if "end" in line), None)
+    if end_line_idx is not None:
+        rows, end_lines = rows[:end_line_idx], [rows[end_line_idx]]
+    elif len(rows) < record_count:
+        return None
+    else:
+        end_lines = []
+    if not rows:
+        return "".join(end_lines)
+
+    # Ends of rows marked by a separator token - a row with a differing column count breaks the alignment
+    col_count = len(rows[0].split())
+    row_width = col_count + 1
+    tokens = "".join(rows).replace("\n", f" {__ROW_SEPARATOR} ").split()
+    if (col_count == 0 or any(idx >= col_count for idx in replaced_columns)
+            or len(tokens) != row_width * len(rows)
+            or tokens[col_count::row_width].count(__ROW_SEPARATOR) != len(rows)):
+        # irregular table - rows built one by one
+        split_rows = [row.split() for row in rows]
+        for row_idx, items in enumerate(split_rows):
+            for col_idx, values in replaced_columns.items():
+                items[col_idx] = values[row_idx]
+        return "".join(map(__build_line, split_rows)) + "".join(end_lines)
+
+    columns = [replaced_columns[col_idx][:len(rows)] if col_idx in replaced_columns else tokens[col_idx::row_width]
+               for col_idx in range(col_count)]
+    return "   " + "    \n   ".join(map("    ".join, zip(*columns))) + "    \n" + "".join(end_lines)
+
+
 def __build_line(items: list):
     line = "   "
     for item in items:
@@ -0,0 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+
+class WorkerPoolError(RuntimeError):
+
+    def __init__(self, failures: Dict[Hashable, BaseException]):
+        self.failures = failures
+        details = "\n".join(f"  {task_id}: {error!r}" for task_id, error in failures.items())
+        super().__init__(f"{len(failures)} task(s) failed:\n{details}")
+
+
+def run_tasks(func: Callable,
+              tasks: Dict[Hashable, Dict[str, Any]],
+              workers: int = 1,
+              use_threads: bool = False) -> Dict[Hashable, Any]:
+    """
+    Runs func(**kwargs) for each task - serially if workers <= 1, otherwise in a pool of workers.
+    Every task is attempted, failures are gathered and raised together.
+
+    @param func: Module-level function (must be picklable when a process pool is used)
+    @param tasks: Task id -> keyword arguments passed to func
+    @param workers: Number of workers in the pool
+    @param use_threads: Use threads instead of processes (for I/O-bound tasks)
+    @return: Task id -> value returned by func (in order of tasks)
+    """
+
+    results = {}
+    failures = {}
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task_id, kwargs in tasks.items():
+            try:
+                results[task_id] = func(**kwargs)
+            except Exception as error:
+                failures[task_id] = error
+    else:
+        executor_cls = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+        with executor_cls(max_workers=min(workers, len(tasks))) as executor:
+            futures = {task_id: executor.submit(func, **kwargs) for task_id, kwargs in tasks.items()}
+            for task_id, future in futures.items():
+                try:
+                    results[task_id] = future.result()
+                except Exception as error:
+                    failures[task_id] = error
+
+    if failures:
+        raise WorkerPoolError(failures)
+    return results